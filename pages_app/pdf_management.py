@@ -1,6 +1,6 @@
 import streamlit as st
 import os
-from utils.pdf_reader import PDFReader
+from utils.text_cache import cache_page_texts
 
 def ensure_directory_exists(directory):
     if not os.path.exists(directory):
@@ -13,8 +13,6 @@ def pdf_management():
     pdf_dir = "pdfs"
     ensure_directory_exists(pdf_dir)
 
-    pdf_reader = PDFReader(input_dir=pdf_dir)
-
     col1, col2 = st.columns(2)
 
     with col1:
@@ -30,7 +28,8 @@ def pdf_management():
                 with open(os.path.join(pdf_dir, uploaded_file.name), "wb") as f:
                     f.write(uploaded_file.getbuffer())
                 st.success(f"Uploaded {uploaded_file.name}")
-                pdf_reader.load_data()  # Automatically process the uploaded PDF
+                # Parse the uploaded PDF now; the RAG page chunks and embeds it when it next loads the index
+                cache_page_texts(os.path.join(pdf_dir, uploaded_file.name))
             if st.button("Refresh Page", key="refresh_page_upload"):
                 st.rerun()
 
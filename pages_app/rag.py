@@ -1,16 +1,42 @@
 import os
 import time
+import logging
 import streamlit as st
-from openai import OpenAI
-from llama_index.llms.openai import OpenAI as LlamaOpenAI
-from llama_index.core import Settings, VectorStoreIndex, Document
+from llama_index.core import Settings, Document, QueryBundle
+from llama_index.core.chat_engine import CondenseQuestionChatEngine
+from llama_index.core.llms import ChatMessage, MessageRole
+from llama_index.core.query_engine import RetrieverQueryEngine
 from utils.pdf_reader import PDFReader
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+from utils.embedding_cache import get_cached_embed_model
+from utils.index_storage import corpus_fingerprint, remove_persisted_indexes
+from utils.index_preloader import IndexPreloader
+from utils.config import get_setting
+from utils.openai_client import get_client, get_llm
+from utils.answer_cache import SIMILARITY_THRESHOLDS, AnswerCache
+from utils.relevance import fit_corpus_vectorizer, grounded_relevance_score, tfidf_similarities
+from utils.context_window import AdjacentChunkExpander
+from utils.hybrid_retriever import HybridRetriever
+from utils.compact_store import CompactChunkStore
+from utils.near_duplicates import collapse_near_duplicates
+from utils.source_files import lazy_source, lazy_zip, source_path
+from utils.page_preview import lazy_page_range, page_label, page_png
 import numpy as np
 import re
 
-client = OpenAI(api_key=st.secrets.openai_key)
+client = get_client()
+
+logger = logging.getLogger(__name__)
+
+
+# One fine-grained index serves every precision level; coarser levels widen each retrieved chunk
+# with its neighbours at query time (roughly 50, 140 and 230 words of context per hit)
+BASE_CHUNK_SIZE = 50
+BASE_OVERLAP_SIZE = 5
+PRECISION_LEVELS = {
+    "Low": 2,
+    "Medium": 1,
+    "High": 0
+}
 
 
 def clear_specific_cache():
@@ -21,66 +47,99 @@ def clear_specific_cache():
 
 
 def clear_all_cache():
-    keys_to_clear = ["cache_key", "chat_engine", "chunk_size", "docs", "pdf_files", "previous_response",
-                     "preloaded_data"]
+    keys_to_clear = ["cache_key", "chat_engine", "chat_engines", "chunk_size", "last_turn", "previous_response"]
     for key in keys_to_clear:
         if key in st.session_state:
             del st.session_state[key]
+    index_preloader.clear()
+    answer_cache.clear()
     st.cache_resource.clear()
     st.cache_data.clear()
 
 
-def generate_cache_key(chunk_size, overlap_size, pdf_files):
-    return f"cache_{chunk_size}_{overlap_size}_{','.join(sorted(pdf_files))}"
-
-
-def get_pdf_files():
-    return [f for f in os.listdir("./pdfs") if f.endswith('.pdf')]
+def load_data_with_chunk_size(chunk_size, overlap_size):
+    start_time = time.time()
+    reader = PDFReader(input_dir="./pdfs", chunk_size=chunk_size, overlap_size=overlap_size)
+    docs = reader.load_data()
+
+    Settings.llm = get_llm(model="gpt-3.5-turbo", temperature=0.5,
+                           system_prompt="You are an expert on university document library. Answer questions based on the provided information.")
+    # Chunks already embedded by any earlier run are served from the local cache, so only new chunks are embedded
+    Settings.embed_model = get_cached_embed_model()
+    # Near-identical chunks (the same paragraph in several versions of a policy) are embedded once; the chunk kept
+    # lists the other files under `duplicate_files`. All chunks stay in the store for context expansion.
+    indexed_docs = collapse_near_duplicates(docs, threshold=get_setting("near_duplicate_threshold", 0.85))
+
+    # Queries are served from compact arrays; the Document list is dropped once this returns
+    store = CompactChunkStore(docs, dtype=get_setting("embedding_dtype", "float32"))
+    store.embed_documents(indexed_docs, Settings.embed_model)
+    remove_persisted_indexes()
+
+    end_time = time.time()
+    processing_time = end_time - start_time
+    logger.info(f"Processing time for chunk size {chunk_size}: {processing_time:.2f} seconds")
+
+    return store
+
+
+def load_multi_resolution_index(corpus_version):
+    # corpus_version only identifies the build for the preloader; the PDFs are read from disk as they are now
+    store = load_data_with_chunk_size(BASE_CHUNK_SIZE, BASE_OVERLAP_SIZE)
+    return {
+        "store": store,
+        # Dense and lexical (BM25) retrieval over the same chunks, so exact terms like policy numbers are found
+        "retriever": HybridRetriever(store, Settings.embed_model),
+        "vectorizer": fit_corpus_vectorizer(list(store.texts())),
+        "postprocessors": {
+            precision: AdjacentChunkExpander(store, window=window)
+            for precision, window in PRECISION_LEVELS.items()
+        }
+    }
 
 
-@st.cache_resource(show_spinner=False)
-def load_data_with_chunk_size(chunk_size, overlap_size, cache_key):
-    start_time = time.time()
-    with st.spinner(text="Loading and indexing the docs – hang tight! This should take 1-2 minutes."):
-        reader = PDFReader(input_dir="./pdfs", chunk_size=chunk_size, overlap_size=overlap_size)
-        docs = reader.load_data()
+def build_query_engine(preloaded_data, precision, streaming=False):
+    return RetrieverQueryEngine.from_args(preloaded_data["retriever"], streaming=streaming,
+                                          node_postprocessors=[preloaded_data["postprocessors"][precision]])
 
-        Settings.llm = LlamaOpenAI(model="gpt-3.5-turbo", temperature=0.5,
-                                   system_prompt="You are an expert on university document library. Answer questions based on the provided information.")
-        index = VectorStoreIndex.from_documents(docs)
 
-        end_time = time.time()
-        processing_time = end_time - start_time
-        st.write(f"Processing time: {processing_time:.2f} seconds")
+def get_chat_session(preloaded_data, precision, streaming, corpus_version):
+    # Engines and chat history are kept per session and precision level, and rebuilt only when the corpus changes
+    chat_sessions = st.session_state.setdefault("chat_engines", {})
+    session_key = (precision, streaming, corpus_version)
+    if session_key not in chat_sessions:
+        for stale_key in [key for key in chat_sessions if key[2] != corpus_version]:
+            del chat_sessions[stale_key]
+        query_engine = build_query_engine(preloaded_data, precision, streaming)
+        chat_sessions[session_key] = {
+            "query_engine": query_engine,
+            "chat_engine": CondenseQuestionChatEngine.from_defaults(query_engine=query_engine, verbose=True),
+            "history": []
+        }
+    return chat_sessions[session_key]
 
-        return index, docs
 
+def remember_turn(chat_session, turn_key, prompt, previous_response):
+    chat_session["history"].extend([
+        ChatMessage(role=MessageRole.USER, content=prompt),
+        ChatMessage(role=MessageRole.ASSISTANT, content=previous_response["content"])
+    ])
+    st.session_state.last_turn = {"key": turn_key, "response": dict(previous_response)}
 
-@st.cache_resource(show_spinner=False)
-def preload_all_precision_levels(pdf_files):
-    precision_levels = {
-        "Low": (200, 20),
-        "Medium": (100, 10),
-        "High": (50, 5)
-    }
 
-    preloaded_data = {}
-    for precision, (chunk_size, overlap_size) in precision_levels.items():
-        cache_key = generate_cache_key(chunk_size, overlap_size, pdf_files)
-        index, docs = load_data_with_chunk_size(chunk_size, overlap_size, cache_key)
-        preloaded_data[precision] = {
-            "index": index,
-            "docs": docs,
-            "chat_engine": index.as_chat_engine(chat_mode="condense_question", verbose=True)
-        }
-    return preloaded_data
+# Shared by all sessions of this server process; builds run on its own thread, outside any script run
+index_preloader = IndexPreloader(load_multi_resolution_index)
 
+# Finished answers shared by all sessions, scoped by precision and corpus version
+answer_cache = AnswerCache(max_entries=get_setting("answer_cache_size", 256),
+                           ttl_seconds=get_setting("answer_cache_ttl", 3600),
+                           similarity_threshold=get_setting("answer_cache_similarity", SIMILARITY_THRESHOLDS.get(
+                               get_setting("embedding_backend", "openai"), 0.95)))
 
 def is_valid_query(query):
     return bool(re.search(r'\b[a-zA-Z]{3,}\b', query))
 
 
-def calculate_accuracy_score(query, response, source_nodes):
+def calculate_accuracy_score(query, response, source_nodes, vectorizer):
     if not is_valid_query(query):
         return 0.0
 
@@ -88,16 +147,16 @@ def calculate_accuracy_score(query, response, source_nodes):
     if "unable to provide an answer" in response.lower() or not response.strip():
         return 0.0
 
-    # Calculate relevance score
-    vectorizer = TfidfVectorizer().fit([query, response])
-    vectors = vectorizer.transform([query, response])
-    relevance_score = cosine_similarity(vectors[0], vectors[1])[0][0]
+    # Query, response and all sources are compared in one pass with the corpus-fitted TF-IDF model
+    relevance_score, _, grounding_scores = tfidf_similarities(vectorizer, query, response,
+                                                              [node.node.text for node in source_nodes])
+    grounding_score = grounding_scores.max() if source_nodes else 0
 
     # Calculate source relevance
-    source_relevance = np.mean([node.score for node in source_nodes]) if source_nodes else 0
+    source_relevance = np.mean([node.score or 0 for node in source_nodes]) if source_nodes else 0
 
     # Combine scores (you may want to adjust weights)
-    combined_score = (relevance_score * 0.7 + source_relevance * 0.3) * 100
+    combined_score = (relevance_score * 0.5 + grounding_score * 0.2 + source_relevance * 0.3) * 100
 
     return min(combined_score, 100)  # Ensure score doesn't exceed 100
 
@@ -133,19 +192,29 @@ def ai_review_score(query, response, initial_score, context):
     Explanation: [Your explanation]
     """
 
-    response = client.chat.completions.create(
-        model="gpt-3.5-turbo",
-        messages=[
-            {"role": "system", "content": "You are an expert at evaluating the relevance of answers to questions."},
-            {"role": "user", "content": prompt}
-        ]
-    )
+    # Bounded, since the page waits for the score: on a timeout or API error the initial score is kept
+    review_client = client.with_options(timeout=get_setting("relevance_review_timeout", 15.0), max_retries=0)
+    try:
+        response = review_client.chat.completions.create(
+            model="gpt-3.5-turbo",
+            messages=[
+                {"role": "system", "content": "You are an expert at evaluating the relevance of answers to questions."},
+                {"role": "user", "content": prompt}
+            ]
+        )
+    except Exception as e:
+        logger.warning(f"Relevance review failed, using the initial score: {e}")
+        return initial_score
 
     ai_response = response.choices[0].message.content
-    score_line = [line for line in ai_response.split('\n') if line.startswith("Score:")][0]
-    ai_score = float(score_line.split(":")[1].strip())
+    # Tolerates markdown, brackets and percent signs around the number; keeps the initial score if none is found
+    score_match = re.search(r'Score\W*(\d+(?:\.\d+)?)', ai_response, re.IGNORECASE)
+    if not score_match:
+        logger.warning(f"Could not parse a score from the review, using the initial score: {ai_response!r}")
+        return initial_score
+    ai_score = float(score_match.group(1))
 
-    return ai_score
+    return min(max(ai_score, 0.0), 100.0)
 
 
 def get_accuracy_color(score):
@@ -157,6 +226,192 @@ def get_accuracy_color(score):
         return "green"
 
 
+def collect_sources(source_nodes):
+    sources = []
+    context_snippets = []
+    citations = []
+    for node in source_nodes:
+        file_path = node.node.extra_info.get('file_path', "Unknown source")
+        source_file = os.path.basename(file_path)
+        if source_file not in sources:
+            sources.append(source_file)
+        # The same passage in other files whose copies were collapsed at indexing time
+        for duplicate_path in node.node.extra_info.get("duplicate_files", []):
+            if os.path.basename(duplicate_path) not in sources:
+                sources.append(os.path.basename(duplicate_path))
+        citation = None
+        if node.node.extra_info.get("page_start") is not None:
+            citation = {"source": source_file, "file_path": file_path, "page_start": node.node.extra_info["page_start"],
+                        "page_end": node.node.extra_info["page_end"]}
+            if citation not in citations:
+                citations.append(citation)
+        context_snippets.append((source_file, node.node.text, citation))
+    return sources, context_snippets, citations
+
+
+def sources_html(sources):
+    return (
+        f'<div style="background-color: #f0f0f0; padding: 10px; border-radius: 5px;">'
+        f'**Sources:**'
+        f'<ul>'
+        f'{"".join([f"<li>{source}</li>" for source in sources])}'
+        f'</ul>'
+        f'</div>'
+    )
+
+
+def relevance_html(accuracy_score):
+    accuracy_color = get_accuracy_color(accuracy_score)
+    return f'''
+        <div style="background-color: #f0f0f0; padding: 10px; border-radius: 5px; margin-bottom: 10px;">
+            <strong>Estimated Relevance:</strong><br>
+            <div style="background-color: #e0e0e0; border-radius: 5px; height: 20px; width: 100%;">
+                <div style="background-color: {accuracy_color}; width: {accuracy_score}%; height: 100%; border-radius: 5px;"></div>
+            </div>
+            <span>{accuracy_score:.2f}% (This score indicates the estimated relevance of the response, not its factual accuracy)</span>
+        </div>
+        '''
+
+
+def answer_html(content):
+    return (
+        '<div style="background-color: #f9f9f9; padding: 10px; border-radius: 5px;">'
+        '<strong>Response:</strong><br>'
+        f'{content}'
+        '</div>'
+    )
+
+
+def local_review_score(query, response, source_nodes, vectorizer):
+    if not is_valid_query(query):
+        return 0.0
+    return grounded_relevance_score(vectorizer, query, response, [node.node.text for node in source_nodes],
+                                    [node.score or 0 for node in source_nodes])
+
+
+def score_response(query, response, source_nodes, vectorizer, scoring_mode="local"):
+    # Nothing was retrieved (e.g. the library is empty), so nothing supports the answer
+    if not source_nodes or vectorizer is None:
+        return 0.0
+    if scoring_mode == "local":
+        return local_review_score(query, response, source_nodes, vectorizer)
+
+    # Slow path: a second LLM round trip reviews the initial score
+    context = "\n".join([node.node.text for node in source_nodes])
+    initial_accuracy_score = calculate_accuracy_score(query, response, source_nodes, vectorizer)
+
+    # AI review of the score
+    return ai_review_score(query, response, initial_accuracy_score, context)
+
+
+def answer_question(preloaded_data, question, precision, query_engine=None, scoring_mode=None):
+    # First-turn, non-streaming version of the page's answer path with every stage timed; used by the batch runner.
+    # Returns the same response dict the page keeps in st.session_state.previous_response, plus timings in seconds.
+    query_engine = query_engine or build_query_engine(preloaded_data, precision)
+    scoring_mode = scoring_mode or get_setting("relevance_scoring", "local")
+    query_bundle = QueryBundle(question)
+    timings = {}
+
+    start = time.perf_counter()
+    source_nodes = query_engine.retrieve(query_bundle)
+    timings["retrieve"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    content = query_engine.synthesize(query_bundle, source_nodes).response or ""
+    timings["synthesize"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    accuracy_score = None
+    if scoring_mode != "off" and content.strip():
+        accuracy_score = score_response(question, content, source_nodes, preloaded_data["vectorizer"], scoring_mode)
+    timings["score"] = time.perf_counter() - start
+
+    response = {"content": content, "accuracy_score": accuracy_score}
+    if source_nodes:
+        response["sources"], response["contexts"], response["citations"] = collect_sources(source_nodes)
+    return response, timings
+
+
+def show_response(previous_response, sources_slot, relevance_slot, answer_slot, contexts_slot, score_pending=False):
+    accuracy_score = previous_response.get("accuracy_score")
+    if accuracy_score is not None and accuracy_score < 5:  # Threshold for very low relevance
+        show_irrelevant(sources_slot, relevance_slot, answer_slot, contexts_slot)
+        return
+
+    sources = previous_response.get("sources", [])
+    if sources:
+        with sources_slot.container():
+            st.markdown(sources_html(sources), unsafe_allow_html=True)
+
+            def download_files():
+                # Files are read only when a button is clicked; clicking does not rerun the page
+                paths = [source_path(source) for source in sources]
+                citations = previous_response.get("citations", [])
+                for i, (source, path) in enumerate(zip(sources, paths)):
+                    st.download_button(label=f"Download {source}", data=lazy_source(path), file_name=source,
+                                       mime="application/pdf", key=f"download_{i}", on_click="ignore")
+                    # Just the cited pages, cut out into a small PDF on first request and kept on disk
+                    for j, citation in enumerate(c for c in citations if c["source"] == source):
+                        pages = page_label(citation["page_start"], citation["page_end"])
+                        st.download_button(label=f"Cited {pages}",
+                                           data=lazy_page_range(citation["file_path"], citation["page_start"],
+                                                                citation["page_end"]),
+                                           file_name=f"{os.path.splitext(source)[0]} ({pages}).pdf",
+                                           mime="application/pdf", key=f"download_{i}_{j}", on_click="ignore")
+                if len(paths) > 1:
+                    st.download_button(label="Download all sources (.zip)", data=lazy_zip(paths),
+                                       file_name="sources.zip", mime="application/zip", key="download_all",
+                                       on_click="ignore")
+
+            download_files()
+
+    if accuracy_score is not None:
+        relevance_slot.markdown(relevance_html(accuracy_score), unsafe_allow_html=True)
+    elif score_pending:
+        relevance_slot.caption("Estimating relevance...")
+
+    answer_slot.markdown(answer_html(previous_response["content"]), unsafe_allow_html=True)
+
+    if "contexts" in previous_response:
+        with contexts_slot.container():
+            with st.expander("View Context Snippets"):
+                # Page images are rendered only on request and cached on disk per page
+                show_pages = st.toggle("Show cited pages", key="show_cited_pages")
+                for source, context, citation in previous_response["contexts"]:
+                    if citation is None:
+                        st.markdown(f"**Source: {source}**")
+                    else:
+                        st.markdown(f"**Source: {source}, {page_label(citation['page_start'], citation['page_end'])}**")
+                    st.text_area("Context:", value=context, height=150, disabled=True)
+                    if show_pages and citation is not None:
+                        for page in range(citation["page_start"], citation["page_end"] + 1):
+                            st.image(page_png(citation["file_path"], page), caption=f"{source}, p. {page}")
+                    st.markdown("---")
+
+
+def show_relevance(previous_response, sources_slot, relevance_slot, answer_slot, contexts_slot):
+    # Called once the background score is in; everything else on the page is already drawn
+    accuracy_score = previous_response["accuracy_score"]
+    if accuracy_score < 5:
+        show_irrelevant(sources_slot, relevance_slot, answer_slot, contexts_slot)
+    else:
+        relevance_slot.markdown(relevance_html(accuracy_score), unsafe_allow_html=True)
+
+
+def show_irrelevant(sources_slot, relevance_slot, answer_slot, contexts_slot):
+    # Sources are only shown if the score is 5 or above
+    sources_slot.markdown(
+        '<div style="background-color: #f0f0f0; padding: 10px; border-radius: 5px; color: #FF0000;">'
+        '<strong>Sources:</strong><br>'
+        'No sources available as the query is not relevant.'
+        '</div>',
+        unsafe_allow_html=True
+    )
+    relevance_slot.warning("The query doesn't seem to be relevant to the available information.")
+    answer_slot.empty()
+    contexts_slot.empty()
+
+
 def rag():
     clear_specific_cache()
     st.title("University Document Library")
@@ -170,11 +425,8 @@ def rag():
         </div>
         """, unsafe_allow_html=True)
 
-    current_pdf_files = get_pdf_files()
-
-    if "preloaded_data" not in st.session_state or set(st.session_state.pdf_files) != set(current_pdf_files):
-        st.session_state.preloaded_data = preload_all_precision_levels(current_pdf_files)
-        st.session_state.pdf_files = current_pdf_files
+    # Content hashes are cached per file modification time, so this is cheap on every rerun
+    current_corpus_version = corpus_fingerprint("./pdfs")
 
     st.write("Select precision level:")
     col1, col2 = st.columns([3, 1])
@@ -182,7 +434,7 @@ def rag():
     with col1:
         precision = st.radio(
             "Precision",
-            options=["Low", "Medium", "High"],
+            options=list(PRECISION_LEVELS),
             horizontal=True,
             label_visibility="collapsed"
         )
@@ -192,15 +444,23 @@ def rag():
             clear_all_cache()
             st.success("Cache cleared successfully!")
             st.rerun()
+        if st.button("New Conversation"):
+            for key in ["chat_engines", "last_turn", "previous_response"]:
+                if key in st.session_state:
+                    del st.session_state[key]
+            # Otherwise the old question is still in the box and would be asked again as the first turn
+            st.session_state.question = ""
+            st.rerun()
 
-    # Use preloaded data
-    preloaded_data = st.session_state.preloaded_data[precision]
-    index = preloaded_data["index"]
-    docs = preloaded_data["docs"]
-    chat_engine = preloaded_data["chat_engine"]
+    index_preloader.request(current_corpus_version, current_corpus_version)
 
-    st.session_state.chat_engine = chat_engine
-    st.session_state.docs = docs
+    # The page becomes usable as soon as the shared index is ready; switching precision needs no rebuild
+    try:
+        with st.spinner(text="Loading and indexing the docs – hang tight!"):
+            preloaded_data = index_preloader.wait(current_corpus_version)
+    except Exception as e:
+        st.error(f"Failed to load the documents: {e}")
+        return
 
     st.markdown(
         """
@@ -210,127 +470,116 @@ def rag():
         </div>
         """, unsafe_allow_html=True)
 
-    prompt = st.text_input("Your question")
+    prompt = st.text_input("Your question", key="question")
+
+    # Results are drawn into fixed slots so a streamed answer is replaced in place by the final rendering
+    col1, col2 = st.columns([1, 2])
+    with col1:
+        sources_slot = st.empty()
+    with col2:
+        relevance_slot = st.empty()
+        answer_slot = st.empty()
+        contexts_slot = st.empty()
 
     if prompt:
         clear_specific_cache()
-        chat_engine = preloaded_data["index"].as_chat_engine(chat_mode="condense_question", verbose=True)
-        # Use this chat_engine for the current query
         if not is_valid_query(prompt):
             st.warning("Please enter a valid question or query.")
             return
 
-        # clear_specific_cache()
-
-        with st.spinner("Thinking..."):
-            response = chat_engine.chat(prompt)
+        # Reruns triggered by other widgets (downloads, buttons) show the last answer again instead of re-asking
+        turn_key = (prompt, precision, current_corpus_version)
+        last_turn = st.session_state.get("last_turn")
+        if last_turn and last_turn["key"] == turn_key:
+            st.session_state.previous_response = dict(last_turn["response"])
+            show_response(st.session_state.previous_response, sources_slot, relevance_slot, answer_slot, contexts_slot)
+            return
 
-            if not response.response.strip():
-                st.warning("I couldn't find any relevant information to answer your query.")
+        streaming = get_setting("stream_answers", True)
+        chat_session = get_chat_session(preloaded_data, precision, streaming, current_corpus_version)
+        history = chat_session["history"]
+        # Without earlier turns there is nothing to condense, so the question goes straight to the query engine
+        # (one LLM call) and can be answered from the shared cache; follow-ups go through the condense-question engine
+        first_turn = not history
+
+        query_embedding = None
+        if first_turn:
+            # Repeated (or near-identical) questions are answered from the shared cache without any LLM round trip
+            cached_response, query_embedding = answer_cache.get(prompt, precision, current_corpus_version,
+                                                                embed_fn=Settings.embed_model.get_query_embedding)
+            if cached_response is not None:
+                st.session_state.previous_response = dict(cached_response)
+                show_response(st.session_state.previous_response, sources_slot, relevance_slot, answer_slot,
+                              contexts_slot)
+                remember_turn(chat_session, turn_key, prompt, st.session_state.previous_response)
                 return
+        # The embedding computed for the cache lookup is reused by the retriever instead of being requested again
+        query_bundle = QueryBundle(prompt, embedding=query_embedding.tolist() if query_embedding is not None else None)
+
+        if streaming:
+            with st.spinner("Thinking..."):
+                if first_turn:
+                    response = chat_session["query_engine"].query(query_bundle)
+                else:
+                    response = chat_session["chat_engine"].stream_chat(prompt, chat_history=history)
+            # Retrieval is done before the first token, so the sources can be shown while the answer streams in
+            sources, context_snippets, citations = collect_sources(response.source_nodes)
+            if sources:
+                sources_slot.markdown(sources_html(sources), unsafe_allow_html=True)
+            content = ""
+            for token in response.response_gen:
+                content += token
+                answer_slot.markdown(answer_html(content + "▌"), unsafe_allow_html=True)
+        else:
+            with st.spinner("Thinking..."):
+                if first_turn:
+                    response = chat_session["query_engine"].query(query_bundle)
+                else:
+                    response = chat_session["chat_engine"].chat(prompt, chat_history=history)
+            content = response.response
+            sources, context_snippets, citations = collect_sources(response.source_nodes)
+
+        if not content.strip():
+            answer_slot.empty()
+            st.warning("I couldn't find any relevant information to answer your query.")
+            return
 
-            source_nodes = response.source_nodes
-            context = "\n".join([node.node.text for node in source_nodes])
-            initial_accuracy_score = calculate_accuracy_score(prompt, response.response, source_nodes)
-
-            # AI review of the score
-            ai_score = ai_review_score(prompt, response.response, initial_accuracy_score, context)
-
-            # Use AI score directly
-            final_accuracy_score = ai_score
-
-            if source_nodes:
-                sources = []
-                context_snippets = []
-                for node in source_nodes:
-                    source_path = node.node.extra_info.get('file_path', "Unknown source")
-                    source_file = os.path.basename(source_path)
-                    if source_file not in sources:
-                        sources.append(source_file)
-                    context_snippets.append((source_file, node.node.text))
-
-                st.session_state.previous_response = {
-                    "content": response.response,
-                    "sources": sources,
-                    "contexts": context_snippets,
-                    "accuracy_score": final_accuracy_score
-                }
-            else:
-                st.session_state.previous_response = {
-                    "content": response.response,
-                    "accuracy_score": final_accuracy_score
-                }
-
-    col1, col2 = st.columns([1, 2])
-
-    with col1:
-        if 'previous_response' in st.session_state:
-            accuracy_score = st.session_state.previous_response.get("accuracy_score", 0)
-            if accuracy_score >= 5:  # Only show sources if the score is 5 or above
-                sources = st.session_state.previous_response.get("sources", [])
-                if sources:
-                    st.markdown(
-                        f'<div style="background-color: #f0f0f0; padding: 10px; border-radius: 5px;">'
-                        f'**Sources:**'
-                        f'<ul>'
-                        f'{"".join([f"<li>{source}</li>" for source in sources])}'
-                        f'</ul>'
-                        f'</div>',
-                        unsafe_allow_html=True
-                    )
-
-                    def download_files():
-                        for i, source in enumerate(sources):
-                            source_path = os.path.join("pdfs", source)
-                            with open(source_path, "rb") as f:
-                                contents = f.read()
-                            st.download_button(label=f"Download {source}", data=contents, file_name=source,
-                                               mime="application/pdf", key=f"download_{i}")
-
-                    download_files()
-            else:
-                st.markdown(
-                    '<div style="background-color: #f0f0f0; padding: 10px; border-radius: 5px; color: #FF0000;">'
-                    '<strong>Sources:</strong><br>'
-                    'No sources available as the query is not relevant.'
-                    '</div>',
-                    unsafe_allow_html=True
-                )
+        source_nodes = response.source_nodes
+        # "local" (default) scores in milliseconds from retrieval and grounding signals, "llm" asks gpt-3.5-turbo
+        scoring_mode = get_setting("relevance_scoring", "local")
 
-    with col2:
-        if 'previous_response' in st.session_state:
-            accuracy_score = st.session_state.previous_response.get("accuracy_score", 0)
-            if accuracy_score < 5:  # Threshold for very low relevance
-                st.warning("The query doesn't seem to be relevant to the available information.")
+        st.session_state.previous_response = {
+            "content": content,
+            "accuracy_score": None
+        }
+        if source_nodes:
+            st.session_state.previous_response["sources"] = sources
+            st.session_state.previous_response["contexts"] = context_snippets
+            st.session_state.previous_response["citations"] = citations
+
+        # The answer and sources are drawn before scoring starts, so a slow LLM review only delays the relevance bar
+        show_response(st.session_state.previous_response, sources_slot, relevance_slot, answer_slot, contexts_slot,
+                      score_pending=scoring_mode != "off")
+
+        if scoring_mode != "off":
+            try:
+                st.session_state.previous_response["accuracy_score"] = score_response(
+                    prompt, content, source_nodes, preloaded_data["vectorizer"], scoring_mode)
+            except Exception as e:
+                logger.error(f"Error scoring response: {e}")
+                relevance_slot.empty()
             else:
-                accuracy_color = get_accuracy_color(accuracy_score)
-                st.markdown(
-                    f'''
-                    <div style="background-color: #f0f0f0; padding: 10px; border-radius: 5px; margin-bottom: 10px;">
-                        <strong>Estimated Relevance:</strong><br>
-                        <div style="background-color: #e0e0e0; border-radius: 5px; height: 20px; width: 100%;">
-                            <div style="background-color: {accuracy_color}; width: {accuracy_score}%; height: 100%; border-radius: 5px;"></div>
-                        </div>
-                        <span>{accuracy_score:.2f}% (This score indicates the estimated relevance of the response, not its factual accuracy)</span>
-                    </div>
-                    ''',
-                    unsafe_allow_html=True
-                )
-
-                st.markdown(
-                    '<div style="background-color: #f9f9f9; padding: 10px; border-radius: 5px;">'
-                    '<strong>Response:</strong><br>'
-                    f'{st.session_state.previous_response["content"]}'
-                    '</div>',
-                    unsafe_allow_html=True
-                )
-
-                if "contexts" in st.session_state.previous_response:
-                    with st.expander("View Context Snippets"):
-                        for source, context in st.session_state.previous_response["contexts"]:
-                            st.markdown(f"**Source: {source}**")
-                            st.text_area("Context:", value=context, height=150, disabled=True)
-                            st.markdown("---")
+                show_relevance(st.session_state.previous_response, sources_slot, relevance_slot, answer_slot,
+                               contexts_slot)
+
+        remember_turn(chat_session, turn_key, prompt, st.session_state.previous_response)
+        # Follow-up answers depend on the conversation, so only first-turn answers are shared
+        scored = scoring_mode == "off" or st.session_state.previous_response["accuracy_score"] is not None
+        if first_turn and scored:
+            answer_cache.put(prompt, precision, current_corpus_version, dict(st.session_state.previous_response),
+                             query_embedding)
+    elif 'previous_response' in st.session_state:
+        show_response(st.session_state.previous_response, sources_slot, relevance_slot, answer_slot, contexts_slot)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,82 @@
+import re
+import time
+import threading
+from collections import OrderedDict
+import numpy as np
+
+
+# Cosine similarity a cached question needs for its answer to be reused for another, per embedding backend. OpenAI
+# embeddings of short questions about the same documents cluster high, so different questions often reach 0.9+.
+SIMILARITY_THRESHOLDS = {"openai": 0.98, "huggingface": 0.95, "hashing": 0.9}
+
+
+def normalize_query(query):
+    return re.sub(r"\s+", " ", re.sub(r"[^\w\s]", " ", query.lower())).strip()
+
+
+def query_identifiers(query):
+    # Words that name a specific document or rule: anything with a digit ("2023", "HR-12") and capitalised words
+    # after the first ("Parking Policy"). Similar questions only share an answer if these are the same.
+    words = re.findall(r"\w+", query)
+    return frozenset(word.lower() for position, word in enumerate(words)
+                     if any(char.isdigit() for char in word) or (position > 0 and word[0].isupper()))
+
+
+# Process-wide LRU cache of finished answers with a time-to-live. Entries are scoped by precision level and corpus
+# version; a lookup matches the normalised query exactly first and otherwise the most similar cached query embedding.
+class AnswerCache:
+    def __init__(self, max_entries=256, ttl_seconds=3600, similarity_threshold=0.95):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, query, precision, corpus_version, embed_fn=None):
+        # Returns (result or None, query embedding or None); the embedding is only computed on an exact-match miss
+        # and should be passed back to put() so it is not computed twice
+        scope = (corpus_version, precision)
+        key = (scope, normalize_query(query))
+        with self.lock:
+            self._expire(corpus_version)
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                return self.entries[key]["result"], None
+            if embed_fn is None:
+                return None, None
+
+        query_embedding = np.asarray(embed_fn(query), dtype=np.float32)
+        query_embedding /= np.linalg.norm(query_embedding) or 1.0
+
+        identifiers = query_identifiers(query)
+        with self.lock:
+            best_key, best_similarity = None, self.similarity_threshold
+            for entry_key, entry in self.entries.items():
+                if entry_key[0] == scope and entry["embedding"] is not None and entry["identifiers"] == identifiers:
+                    similarity = float(entry["embedding"] @ query_embedding)
+                    if similarity >= best_similarity:
+                        best_key, best_similarity = entry_key, similarity
+            if best_key is None:
+                return None, query_embedding
+            self.entries.move_to_end(best_key)
+            return self.entries[best_key]["result"], query_embedding
+
+    def put(self, query, precision, corpus_version, result, query_embedding=None):
+        key = ((corpus_version, precision), normalize_query(query))
+        with self.lock:
+            self.entries[key] = {"result": result, "embedding": query_embedding,
+                                 "identifiers": query_identifiers(query), "created": time.time()}
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def _expire(self, corpus_version):
+        # Drops timed-out entries and every answer built on another version of the corpus
+        now = time.time()
+        for key in [key for key, entry in self.entries.items()
+                    if now - entry["created"] > self.ttl_seconds or key[0][0] != corpus_version]:
+            del self.entries[key]
@@ -0,0 +1,166 @@
+import os
+import sys
+import json
+import time
+import argparse
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# Allow running this file directly as well as importing it
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+from utils.config import get_setting
+
+logger = logging.getLogger(__name__)
+
+QUESTION_FIELDS = ["question", "query", "prompt", "body"]
+ID_FIELDS = ["id", "request_id", "question_id"]
+STAGES = ["retrieve", "synthesize", "score", "total"]
+
+
+# Spaces calls evenly so no more than `rate` start per second across all worker threads (0 = unlimited)
+class RateLimiter:
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.next_slot = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            slot = max(self.next_slot, now)
+            self.next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def load_questions(path, question_field=None, id_field=None):
+    # One JSON object per line; the question and id are read from the first field present, so files such as the
+    # repo's requests.jsonl (request_id, title, body) work without conversion
+    questions = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            question = next((record[field] for field in ([question_field] if question_field else QUESTION_FIELDS)
+                             if record.get(field)), None)
+            if question is None:
+                logger.warning(f"Skipping line {line_number} of {path}: no question field")
+                continue
+            question_id = next((record[field] for field in ([id_field] if id_field else ID_FIELDS)
+                                if field in record), line_number)
+            questions.append({"id": question_id, "question": question})
+    return questions
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    position = (len(ordered) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def latency_report(results, wall_time):
+    lines = [f"{len(results)} questions in {wall_time:.2f}s "
+             f"({len(results) / wall_time if wall_time else 0.0:.2f} questions/s), "
+             f"{sum(1 for result in results if 'error' in result)} failed",
+             f"{'stage':<12}{'mean':>9}{'p50':>9}{'p90':>9}{'p99':>9}{'max':>9}"]
+    for stage in STAGES:
+        values = [result["timings"][stage] for result in results if stage in result.get("timings", {})]
+        if values:
+            lines.append(f"{stage:<12}{sum(values) / len(values):>9.3f}{percentile(values, 0.5):>9.3f}"
+                         f"{percentile(values, 0.9):>9.3f}{percentile(values, 0.99):>9.3f}{max(values):>9.3f}")
+    return "\n".join(lines)
+
+
+def run_batch(questions, precision="Medium", concurrency=4, rate_limit=2.0, scoring_mode=None, on_result=None):
+    # Answers every question through the same index, retriever, synthesizer and scorer as the RAG page.
+    # Returns the results in input order and the seconds spent answering (index loading excluded); on_result, if
+    # given, is called with each result as it finishes.
+    from pages_app.rag import PRECISION_LEVELS, answer_question, build_query_engine, load_multi_resolution_index
+    from utils.index_storage import corpus_fingerprint
+
+    if precision not in PRECISION_LEVELS:
+        raise ValueError(f"Unknown precision level: {precision}")
+    start = time.perf_counter()
+    preloaded_data = load_multi_resolution_index(corpus_fingerprint("./pdfs"))
+    logger.info(f"Index ready in {time.perf_counter() - start:.2f}s")
+    query_engine = build_query_engine(preloaded_data, precision)
+    limiter = RateLimiter(rate_limit)
+
+    def answer(item):
+        limiter.wait()
+        result = {"id": item["id"], "question": item["question"], "precision": precision}
+        started = time.perf_counter()
+        try:
+            response, timings = answer_question(preloaded_data, item["question"], precision,
+                                                query_engine=query_engine, scoring_mode=scoring_mode)
+        except Exception as e:
+            logger.error(f"Error answering {item['id']}: {e}")
+            result["error"] = str(e)
+            result["timings"] = {"total": time.perf_counter() - started}
+            return result
+        timings["total"] = time.perf_counter() - started
+        result.update({
+            "answer": response["content"],
+            "accuracy_score": response["accuracy_score"],
+            "sources": response.get("sources", []),
+            "citations": response.get("citations", []),
+            "contexts": [{"source": source, "text": text} for source, text, _ in response.get("contexts", [])],
+            "timings": timings
+        })
+        return result
+
+    start = time.perf_counter()
+    results = [None] * len(questions)
+    with ThreadPoolExecutor(max_workers=max(concurrency, 1), thread_name_prefix="batch-runner") as executor:
+        futures = {executor.submit(answer, item): position for position, item in enumerate(questions)}
+        for future in as_completed(futures):
+            results[futures[future]] = future.result()
+            if on_result is not None:
+                on_result(future.result())
+    return results, time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Answer a JSONL file of questions with the RAG pipeline.")
+    parser.add_argument("input", help="JSONL file with one question per line")
+    parser.add_argument("-o", "--output", default="batch_answers.jsonl", help="JSONL file the answers are written to")
+    parser.add_argument("--precision", default="Medium", help="Precision level: Low, Medium or High")
+    parser.add_argument("--concurrency", type=int, default=get_setting("batch_concurrency", 4))
+    parser.add_argument("--rate-limit", type=float, default=get_setting("batch_rate_limit", 2.0),
+                        help="Maximum questions started per second (0 = unlimited)")
+    parser.add_argument("--scoring", choices=["local", "llm", "off"], default=None,
+                        help="Relevance scoring mode (defaults to the relevance_scoring setting)")
+    parser.add_argument("--question-field", default=None)
+    parser.add_argument("--id-field", default=None)
+    parser.add_argument("--limit", type=int, default=None, help="Only run the first N questions")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    input_path, output_path = os.path.abspath(args.input), os.path.abspath(args.output)
+    questions = load_questions(input_path, args.question_field, args.id_field)[:args.limit]
+    # The pipeline reads ./pdfs, ./storage and ./processed_chunks like the Streamlit app
+    os.chdir(ROOT_DIR)
+
+    with open(output_path, "w", encoding="utf-8") as f:
+        def write_result(result):
+            # Written as each answer finishes so a long run can be followed and survives an interruption
+            f.write(json.dumps(result, ensure_ascii=False) + "\n")
+            f.flush()
+
+        results, wall_time = run_batch(questions, args.precision, args.concurrency, args.rate_limit, args.scoring,
+                                       on_result=write_result)
+    print(latency_report(results, wall_time))
+    print(f"Answers written to {output_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+import re
+import hashlib
+from collections import Counter
+import numpy as np
+
+# Lines are compared lower-cased with whitespace collapsed and every number replaced by "#",
+# so "Page 3 of 12" and "Page 4 of 12" count as the same line
+DIGIT_PATTERN = re.compile(r"\d+")
+SPACE_PATTERN = re.compile(r"\s+")
+# Lines without a word of three or more letters (list markers like "1.2", bullets) are never treated as boilerplate
+WORD_PATTERN = re.compile(r"[a-z]{3}")
+
+# Within one document: lines on at least half of the pages (and on at least 3) - running headers, footers, page numbers
+MIN_PAGES = 3
+PAGE_RATIO = 0.5
+# Across documents: sentences of 6+ words found in at least a quarter of the documents (and in at least 3) - disclaimers
+# such as "Please refer to the electronic copy ...". Shorter shared lines are mostly field labels ("Date approved")
+# whose values answer questions, so they are kept.
+MIN_DOCUMENTS = 3
+DOCUMENT_RATIO = 0.25
+MIN_CORPUS_WORDS = 6
+
+
+def normalize_line(line):
+    return DIGIT_PATTERN.sub("#", SPACE_PATTERN.sub(" ", line.strip().lower()))
+
+
+def line_hash(normalized_line):
+    # Lines are kept as 64-bit hashes, so the corpus-wide pass holds 8 bytes per line instead of its text
+    return int.from_bytes(hashlib.blake2b(normalized_line.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def page_lines(page_text):
+    return {normalize_line(line) for line in page_text.splitlines() if line.strip()}
+
+
+def repeated_page_lines(page_counts, page_count):
+    # page_counts: line hash -> number of pages of the document it is on
+    if page_count < MIN_PAGES:
+        return set()
+    threshold = max(MIN_PAGES, PAGE_RATIO * page_count)
+    return {line for line, count in page_counts.items() if count >= threshold}
+
+
+def repeated_corpus_lines(document_line_arrays):
+    # document_line_arrays: one array of distinct long-line hashes per document
+    if not document_line_arrays:
+        return np.zeros(0, dtype=np.uint64)
+    lines, counts = np.unique(np.concatenate(document_line_arrays), return_counts=True)
+    threshold = max(MIN_DOCUMENTS, DOCUMENT_RATIO * len(document_line_arrays))
+    return lines[counts >= threshold]
+
+
+def line_stats(page_texts):
+    # Everything the corpus-wide pass needs from one document, gathered one page at a time: the hashes of its own
+    # repeated lines and an array of the hashes of its distinct lines long enough to be shared boilerplate
+    page_counts = Counter()
+    long_lines = set()
+    page_count = 0
+    for page_text in page_texts:
+        for line in page_lines(page_text):
+            if WORD_PATTERN.search(line):
+                page_counts[line_hash(line)] += 1
+            if len(line.split()) >= MIN_CORPUS_WORDS:
+                long_lines.add(line_hash(line))
+        page_count += 1
+    return repeated_page_lines(page_counts, page_count), np.fromiter(long_lines, dtype=np.uint64, count=len(long_lines))
+
+
+def boilerplate_by_file(stats_by_file):
+    # stats_by_file: file path -> line_stats(); returns file path -> hashes of the normalised lines to strip from it
+    corpus_lines = repeated_corpus_lines([document_lines for _, document_lines in stats_by_file.values()])
+    return {file_path: page_lines | set(document_lines[np.isin(document_lines, corpus_lines)].tolist())
+            for file_path, (page_lines, document_lines) in stats_by_file.items()}
+
+
+def boilerplate_fingerprint(lines):
+    return hashlib.sha256("\n".join(str(line) for line in sorted(lines)).encode("utf-8")).hexdigest()[:16]
+
+
+def strip_boilerplate(page_texts, lines):
+    # Lazily, page by page, yields (stripped text, kept runs); pages are kept (possibly empty) so page numbers still
+    # line up with the PDF. Kept runs are (offset in the stripped text, offset in the page text) at the start of every
+    # run of kept lines, so positions in the stripped text can be mapped back to the extracted page.
+    for page_text in page_texts:
+        if not lines:
+            yield page_text, [(0, 0)]
+            continue
+        parts, runs = [], []
+        stripped_length = page_offset = 0
+        previous_kept = False
+        for line in page_text.splitlines(keepends=True):
+            kept = line_hash(normalize_line(line)) not in lines
+            if kept:
+                if not previous_kept:
+                    runs.append((stripped_length, page_offset))
+                parts.append(line)
+                stripped_length += len(line)
+            previous_kept = kept
+            page_offset += len(line)
+        yield "".join(parts), runs
@@ -1,17 +1,17 @@
 import os
+import sys
 import logging
-
-import openai
-from openai import OpenAI
 from time import sleep
-import streamlit as st
+
+# Allow running this file directly as well as importing it from the dashboard
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.openai_client import get_client
 
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 
-openai.api_key = st.secrets.openai_key
-client = OpenAI(api_key=openai.api_key)
+client = get_client()
 
 
 def retry_with_exponential_backoff(
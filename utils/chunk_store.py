@@ -0,0 +1,91 @@
+import os
+import re
+import json
+import pickle
+import shutil
+import logging
+import tempfile
+
+# Bump when the layout of a stored chunk changes so old shards are ignored
+CHUNK_FORMAT_VERSION = 4
+
+logger = logging.getLogger(__name__)
+
+
+def atomic_write(path, data):
+    # Write to a temp file in the target directory and rename it over the target in one step
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def remove_other_versions(parent_dir, version):
+    # Deletes the v<N> directories under parent_dir left behind by earlier format versions (all of them if version is
+    # None)
+    for entry in os.listdir(parent_dir) if os.path.isdir(parent_dir) else []:
+        if re.fullmatch(r"v\d+", entry) and entry != f"v{version}":
+            shutil.rmtree(os.path.join(parent_dir, entry), ignore_errors=True)
+            logger.info(f"Removed {os.path.join(parent_dir, entry)} of an old format version")
+
+
+# One pickle shard per (chunk key, chunk size, overlap) plus a small manifest of file path -> chunk key. The chunk key
+# is the file's content hash plus anything else its chunks depend on, such as the boilerplate stripped from it.
+class ChunkStore:
+    def __init__(self, save_dir, chunk_size, overlap_size):
+        self.save_dir = save_dir
+        self.shard_dir = os.path.join(save_dir, f"v{CHUNK_FORMAT_VERSION}", f"chunks_{chunk_size}_{overlap_size}")
+        self.manifest_path = os.path.join(self.shard_dir, "manifest.json")
+        self.manifest = self.load_manifest()
+        self.dirty = False
+
+    def load_manifest(self):
+        try:
+            with open(self.manifest_path, "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def save_manifest(self):
+        if self.dirty:
+            atomic_write(self.manifest_path, json.dumps(self.manifest, indent=2, sort_keys=True).encode("utf-8"))
+            self.dirty = False
+
+    def shard_path(self, chunk_key):
+        return os.path.join(self.shard_dir, f"{chunk_key}.pkl")
+
+    def get(self, file_path, chunk_key):
+        # Shards are named by chunk key, so an existing shard is valid whatever the file's mtime says
+        try:
+            with open(self.shard_path(chunk_key), "rb") as f:
+                chunks = pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return None
+        if self.manifest.get(file_path) != chunk_key:
+            self.manifest[file_path] = chunk_key
+            self.dirty = True
+        return chunks
+
+    def put(self, file_path, chunk_key, chunks):
+        atomic_write(self.shard_path(chunk_key), pickle.dumps(chunks, protocol=pickle.HIGHEST_PROTOCOL))
+        self.manifest[file_path] = chunk_key
+        self.dirty = True
+
+    def prune(self, file_paths):
+        # Forget files that no longer exist and delete shards no remaining file points to
+        for file_path in [path for path in self.manifest if path not in file_paths]:
+            del self.manifest[file_path]
+            self.dirty = True
+        live_shards = {f"{chunk_key}.pkl" for chunk_key in self.manifest.values()}
+        for entry in os.listdir(self.shard_dir) if os.path.isdir(self.shard_dir) else []:
+            if entry.endswith(".pkl") and entry not in live_shards:
+                os.remove(os.path.join(self.shard_dir, entry))
+                logger.info(f"Removed stale chunk shard {entry}")
+        remove_other_versions(self.save_dir, CHUNK_FORMAT_VERSION)
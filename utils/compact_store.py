@@ -0,0 +1,147 @@
+import logging
+import numpy as np
+from llama_index.core.schema import MetadataMode, TextNode
+
+logger = logging.getLogger(__name__)
+
+# Metadata stored as one integer column each; file_path is kept as a code into a short list of paths
+INT_COLUMNS = ["chunk_id", "page_start", "page_end", "char_start", "char_end", "text_start"]
+
+
+# All chunks of the corpus in a handful of arrays instead of one llama_index Document per chunk: the text as a single
+# UTF-8 buffer with an offsets array, metadata in columns and the embeddings of the indexed chunks in one contiguous
+# matrix of unit vectors (float32, or float16 to halve it). Rows are in document order, so the chunks of a file are
+# consecutive and ordered by chunk_id.
+class CompactChunkStore:
+    def __init__(self, docs, dtype=np.float32):
+        self.dtype = np.dtype(dtype)
+        self.file_paths = []
+        file_codes = {}
+        encoded = []
+        offsets = [0]
+        columns = {name: [] for name in INT_COLUMNS}
+        codes = []
+        # Sparse, since only the representatives of collapsed near-duplicates have it
+        self.duplicate_files = {}
+        for row, doc in enumerate(docs):
+            metadata = doc.metadata
+            file_path = metadata["file_path"]
+            if file_path not in file_codes:
+                file_codes[file_path] = len(self.file_paths)
+                self.file_paths.append(file_path)
+            codes.append(file_codes[file_path])
+            for name in INT_COLUMNS:
+                columns[name].append(metadata.get(name, -1))
+            if metadata.get("duplicate_files"):
+                self.duplicate_files[row] = list(metadata["duplicate_files"])
+            text = doc.text.encode("utf-8")
+            encoded.append(text)
+            offsets.append(offsets[-1] + len(text))
+
+        self.text_buffer = b"".join(encoded)
+        self.offsets = np.array(offsets, dtype=np.int64)
+        self.file_codes = np.array(codes, dtype=np.int32)
+        self.columns = {name: np.array(values, dtype=np.int64 if name == "text_start" else np.int32)
+                        for name, values in columns.items()}
+        # First row and chunk count of every file, for (file_path, chunk_id) -> row lookups
+        self.file_index = file_codes
+        self.file_first_rows = np.searchsorted(self.file_codes, np.arange(len(self.file_paths)))
+        self.file_chunk_counts = np.bincount(self.file_codes, minlength=len(self.file_paths))
+
+        self.embeddings = np.zeros((0, 0), dtype=self.dtype)
+        self.embedded_rows = np.zeros(0, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def text(self, row):
+        return self.text_buffer[self.offsets[row]:self.offsets[row + 1]].decode("utf-8")
+
+    def texts(self):
+        for row in range(len(self)):
+            yield self.text(row)
+
+    def row(self, file_path, chunk_id):
+        # Row of a chunk, or None if the file or chunk does not exist
+        code = self.file_index.get(file_path)
+        if code is None or chunk_id < 0 or chunk_id >= self.file_chunk_counts[code]:
+            return None
+        return int(self.file_first_rows[code]) + chunk_id
+
+    def file_path(self, row):
+        return self.file_paths[self.file_codes[row]]
+
+    def metadata(self, row):
+        metadata = {"file_path": self.file_path(row)}
+        for name, column in self.columns.items():
+            if column[row] >= 0:
+                metadata[name] = int(column[row])
+        if row in self.duplicate_files:
+            metadata["duplicate_files"] = list(self.duplicate_files[row])
+        return metadata
+
+    def node(self, row):
+        # Built on demand for the few chunks a query returns; only the file path is shown to the LLM, as for the
+        # indexed documents
+        metadata = self.metadata(row)
+        excluded_keys = [key for key in metadata if key != "file_path"]
+        return TextNode(text=self.text(row), id_=f"{metadata['file_path']}#{metadata['chunk_id']}", metadata=metadata,
+                        excluded_embed_metadata_keys=excluded_keys, excluded_llm_metadata_keys=excluded_keys)
+
+    def set_embeddings(self, rows, embeddings):
+        if not len(rows):
+            # Empty corpus (every PDF removed): searches simply return nothing
+            self.embeddings = np.zeros((0, 0), dtype=self.dtype)
+            self.embedded_rows = np.zeros(0, dtype=np.int64)
+            return
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        self.embeddings = np.ascontiguousarray(matrix / norms, dtype=self.dtype)
+        self.embedded_rows = np.asarray(rows, dtype=np.int64)
+
+    def embed_documents(self, docs, embed_model):
+        # Embeds the given documents (the chunks to index, each also a row of this store) with the text llama_index
+        # would embed for them. With the cached embedding model, every chunk embedded before is read from the SQLite
+        # cache, so a restart or a corpus change only pays for new chunks and nothing is serialised per corpus.
+        rows = [self.row(doc.metadata["file_path"], doc.metadata["chunk_id"]) for doc in docs]
+        embeddings = embed_model.get_text_embedding_batch([doc.get_content(metadata_mode=MetadataMode.EMBED)
+                                                           for doc in docs])
+        order = np.argsort(rows, kind="stable")
+        self.set_embeddings(np.asarray(rows, dtype=np.int64)[order], np.asarray(embeddings, dtype=np.float32)[order])
+        logger.info(f"Compact store: {len(self)} chunks, {len(rows)} embeddings of dimension "
+                    f"{self.embeddings.shape[1] if len(rows) else 0} as {self.dtype.name}, "
+                    f"{self.nbytes() / 1e6:.1f} MB")
+
+    def nbytes(self):
+        return (len(self.text_buffer) + self.offsets.nbytes + self.file_codes.nbytes + self.embeddings.nbytes
+                + self.embedded_rows.nbytes + sum(column.nbytes for column in self.columns.values()))
+
+    def similarities(self, query_embedding, block_size=8192):
+        # Cosine similarity of the query with every embedded chunk in one matrix-vector product; float16 matrices are
+        # widened a block at a time, as NumPy has no fast float16 product
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+        if not len(self.embedded_rows):
+            return np.zeros(0, dtype=np.float32)
+        if self.dtype == np.float32:
+            return self.embeddings @ query
+        return np.concatenate([self.embeddings[start:start + block_size].astype(np.float32) @ query
+                               for start in range(0, len(self.embeddings), block_size)])
+
+    def search(self, query_embedding, top_k):
+        # Returns [(row, cosine similarity)] of the top_k embedded chunks, best first
+        scores = self.similarities(query_embedding)
+        if not len(scores):
+            return []
+        top_k = min(top_k, len(scores))
+        top = np.argpartition(-scores, top_k - 1)[:top_k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(int(self.embedded_rows[position]), float(scores[position])) for position in top]
+
+    def similarity(self, row, query_embedding):
+        position = np.searchsorted(self.embedded_rows, row)
+        if position >= len(self.embedded_rows) or self.embedded_rows[position] != row:
+            return 0.0
+        query = np.asarray(query_embedding, dtype=np.float32)
+        return float(self.embeddings[position].astype(np.float32) @ query / (np.linalg.norm(query) or 1.0))
@@ -0,0 +1,21 @@
+import os
+import streamlit as st
+
+
+def get_setting(name, default=None):
+    # Environment variables (POLINFOMAN_<NAME>) win over .streamlit/secrets.toml, which wins over the default
+    value = os.environ.get(f"POLINFOMAN_{name.upper()}")
+    if value is None:
+        try:
+            value = st.secrets.get(name)
+        except Exception:
+            # No secrets file, e.g. when running outside of `streamlit run`
+            value = None
+    if value is None:
+        return default
+
+    if isinstance(default, bool):
+        return value if isinstance(value, bool) else str(value).strip().lower() in ("1", "true", "yes", "on")
+    if isinstance(default, (int, float)) and not isinstance(value, (int, float)):
+        return type(default)(value)
+    return value
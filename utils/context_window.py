@@ -0,0 +1,85 @@
+from llama_index.core.bridge.pydantic import Field, PrivateAttr
+from llama_index.core.postprocessor.types import BaseNodePostprocessor
+from llama_index.core.schema import NodeWithScore, TextNode
+
+
+# Widens each retrieved fine-grained chunk to `window` neighbouring chunks on either side, merging windows of the same
+# file that touch, so one small-chunk index can serve coarser precision levels at query time. Neighbours are read from
+# a CompactChunkStore holding every chunk, including near-duplicates that were not embedded.
+class AdjacentChunkExpander(BaseNodePostprocessor):
+    window: int = Field(default=0, description="Number of neighbouring chunks added on each side.")
+    _store: object = PrivateAttr()
+
+    def __init__(self, store, window=0, **kwargs):
+        super().__init__(window=window, **kwargs)
+        self._store = store
+
+    @classmethod
+    def class_name(cls):
+        return "AdjacentChunkExpander"
+
+    def _postprocess_nodes(self, nodes, query_bundle=None):
+        if self.window <= 0:
+            return nodes
+
+        # file_path -> list of (start_id, end_id, score, metadata)
+        spans_by_file = {}
+        for node_with_score in nodes:
+            metadata = node_with_score.node.metadata
+            file_path, chunk_id = metadata.get("file_path"), metadata.get("chunk_id")
+            if chunk_id is None or self._store.row(file_path, chunk_id) is None:
+                continue
+            start_id = max(chunk_id - self.window, 0)
+            end_id = chunk_id + self.window
+            while self._store.row(file_path, end_id) is None:
+                end_id -= 1
+            spans_by_file.setdefault(file_path, []).append((start_id, end_id, node_with_score.score or 0.0, metadata))
+
+        for file_path, spans in spans_by_file.items():
+            merged = []
+            for span in sorted(spans, key=lambda span: span[0]):
+                if merged and span[0] <= merged[-1][1] + 1:
+                    best = max(merged[-1], span, key=lambda span: span[2])
+                    merged[-1] = (merged[-1][0], max(merged[-1][1], span[1]), best[2], best[3])
+                else:
+                    merged.append(span)
+            spans_by_file[file_path] = merged
+
+        expanded = []
+        for file_path, spans in spans_by_file.items():
+            for start_id, end_id, score, metadata in spans:
+                first = self._store.metadata(self._store.row(file_path, start_id))
+                last = self._store.metadata(self._store.row(file_path, end_id))
+                # The widened window runs from the first chunk's start to the last chunk's end
+                position = {key: value for key, value in (("page_start", first.get("page_start")),
+                                                          ("char_start", first.get("char_start")),
+                                                          ("page_end", last.get("page_end")),
+                                                          ("char_end", last.get("char_end"))) if value is not None}
+                merged_metadata = {**metadata, "chunk_id": start_id, "last_chunk_id": end_id, **position}
+                # Only the file path is shown to the embedding model and the LLM
+                excluded_keys = [key for key in merged_metadata if key != "file_path"]
+                node = TextNode(
+                    text=self.merge_chunks(file_path, start_id, end_id),
+                    metadata=merged_metadata,
+                    excluded_embed_metadata_keys=excluded_keys,
+                    excluded_llm_metadata_keys=excluded_keys,
+                )
+                expanded.append(NodeWithScore(node=node, score=score))
+        return sorted(expanded, key=lambda n: n.score or 0.0, reverse=True)
+
+    def merge_chunks(self, file_path, start_id, end_id):
+        # Chunks are slices of the same document text (text_start being where each begins), so each later chunk
+        # contributes only what lies past the end of the text merged so far; the shared overlap is cut by offset
+        text_starts = self._store.columns["text_start"]
+        first_row = self._store.row(file_path, start_id)
+        parts = [self._store.text(first_row)]
+        merged_end = text_starts[first_row] + len(parts[0])
+        for row in range(first_row + 1, first_row + end_id - start_id + 1):
+            text = self._store.text(row)
+            if text_starts[row] >= merged_end:
+                # No overlap: the whitespace between the two slices is not stored, so a single space stands in
+                parts.append(" " + text)
+            else:
+                parts.append(text[merged_end - text_starts[row]:])
+            merged_end = max(merged_end, text_starts[row] + len(text))
+        return "".join(parts)
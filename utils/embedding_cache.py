@@ -0,0 +1,107 @@
+import os
+import sqlite3
+import hashlib
+import logging
+import threading
+import numpy as np
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.bridge.pydantic import PrivateAttr
+from utils.embeddings import create_embed_model
+
+EMBEDDING_CACHE_PATH = "./storage/embedding_cache.sqlite"
+
+logger = logging.getLogger(__name__)
+
+
+def text_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    def __init__(self, db_path=EMBEDDING_CACHE_PATH):
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        # Index builds may run on background threads, so the connection is shared behind a lock
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock:
+            self.conn.execute('''CREATE TABLE IF NOT EXISTS embeddings
+                                 (model TEXT NOT NULL,
+                                 text_hash TEXT NOT NULL,
+                                 embedding BLOB NOT NULL,
+                                 PRIMARY KEY (model, text_hash))''')
+            self.conn.commit()
+
+    def get_many(self, model, hashes):
+        found = {}
+        with self.lock:
+            # Stay well below SQLite's bound-parameter limit
+            for start in range(0, len(hashes), 500):
+                batch = hashes[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self.conn.execute(
+                    f'SELECT text_hash, embedding FROM embeddings WHERE model = ? AND text_hash IN ({placeholders})',
+                    (model, *batch)
+                ).fetchall()
+                for row_hash, blob in rows:
+                    found[row_hash] = np.frombuffer(blob, dtype=np.float32).tolist()
+        return found
+
+    def put_many(self, model, items):
+        with self.lock:
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO embeddings (model, text_hash, embedding) VALUES (?, ?, ?)',
+                [(model, row_hash, np.asarray(embedding, dtype=np.float32).tobytes()) for row_hash, embedding in items]
+            )
+            self.conn.commit()
+
+
+class CachedEmbedding(BaseEmbedding):
+    _embed_model: BaseEmbedding = PrivateAttr()
+    _cache: EmbeddingCache = PrivateAttr()
+
+    def __init__(self, embed_model, cache, **kwargs):
+        super().__init__(model_name=embed_model.model_name, embed_batch_size=embed_model.embed_batch_size, **kwargs)
+        self._embed_model = embed_model
+        self._cache = cache
+
+    @classmethod
+    def class_name(cls):
+        return "CachedEmbedding"
+
+    def _get_query_embedding(self, query):
+        return self._embed_model.get_query_embedding(query)
+
+    async def _aget_query_embedding(self, query):
+        return await self._embed_model.aget_query_embedding(query)
+
+    def _get_text_embedding(self, text):
+        return self._get_text_embeddings([text])[0]
+
+    def _get_text_embeddings(self, texts):
+        hashes = [text_hash(text) for text in texts]
+        cached = self._cache.get_many(self.model_name, list(set(hashes)))
+
+        missing = {}
+        for row_hash, text in zip(hashes, texts):
+            if row_hash not in cached:
+                missing.setdefault(row_hash, text)
+        if missing:
+            embeddings = self._embed_model.get_text_embedding_batch(list(missing.values()))
+            new_items = list(zip(missing.keys(), embeddings))
+            self._cache.put_many(self.model_name, new_items)
+            cached.update(new_items)
+        logger.info(f"Embedding cache: {len(texts) - len(missing)} hits, {len(missing)} misses")
+
+        return [cached[row_hash] for row_hash in hashes]
+
+
+_cached_embed_model = None
+_cached_embed_model_lock = threading.Lock()
+
+
+def get_cached_embed_model():
+    global _cached_embed_model
+    with _cached_embed_model_lock:
+        if _cached_embed_model is None:
+            _cached_embed_model = CachedEmbedding(create_embed_model(), EmbeddingCache())
+        return _cached_embed_model
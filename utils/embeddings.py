@@ -0,0 +1,58 @@
+import logging
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.bridge.pydantic import PrivateAttr
+from sklearn.feature_extraction.text import HashingVectorizer
+from utils.config import get_setting
+from utils.openai_client import get_embedding_model
+
+logger = logging.getLogger(__name__)
+
+
+# Offline embedding backend: hashed unigram + bigram counts projected to a fixed dimension and L2-normalised.
+# Stateless, so it needs no fitting, is deterministic across machines and embeds a whole batch in one sparse transform.
+class HashingEmbedding(BaseEmbedding):
+    _vectorizer: HashingVectorizer = PrivateAttr()
+
+    def __init__(self, dimensions=1024, **kwargs):
+        super().__init__(model_name=f"hashing-{dimensions}", embed_batch_size=256, **kwargs)
+        self._vectorizer = HashingVectorizer(n_features=dimensions, ngram_range=(1, 2), alternate_sign=False,
+                                             norm="l2")
+
+    @classmethod
+    def class_name(cls):
+        return "HashingEmbedding"
+
+    def _embed(self, texts):
+        return self._vectorizer.transform(texts).toarray().tolist()
+
+    def _get_query_embedding(self, query):
+        return self._embed([query])[0]
+
+    async def _aget_query_embedding(self, query):
+        return self._get_query_embedding(query)
+
+    def _get_text_embedding(self, text):
+        return self._embed([text])[0]
+
+    def _get_text_embeddings(self, texts):
+        return self._embed(texts)
+
+
+def create_embed_model():
+    # Selected once through the `embedding_backend` setting and used by every index build:
+    #   openai      - remote OpenAI embeddings (default)
+    #   hashing     - HashingEmbedding, CPU only and fully offline
+    #   huggingface - a sentence-transformers model stored at `embedding_model_path`, run locally in batches
+    backend = get_setting("embedding_backend", "openai")
+    logger.info(f"Using {backend} embedding backend")
+
+    if backend == "hashing":
+        return HashingEmbedding(dimensions=get_setting("embedding_dimensions", 1024))
+    if backend == "huggingface":
+        # Optional dependency, only needed when this backend is selected
+        from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+        return HuggingFaceEmbedding(model_name=get_setting("embedding_model_path"), device="cpu",
+                                    embed_batch_size=get_setting("embedding_batch_size", 64))
+    if backend == "openai":
+        return get_embedding_model()
+    raise ValueError(f"Unknown embedding backend: {backend}")
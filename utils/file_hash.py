@@ -0,0 +1,26 @@
+import hashlib
+import os
+
+# (absolute path, mtime_ns, size) -> sha256 hex digest, so unchanged files are only read once per process
+_hash_cache = {}
+
+
+def file_sha256(file_path, block_size=1 << 20):
+    stat = os.stat(file_path)
+    cache_key = (os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size)
+    if cache_key not in _hash_cache:
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for block in iter(lambda: f.read(block_size), b""):
+                digest.update(block)
+        _hash_cache[cache_key] = digest.hexdigest()
+    return _hash_cache[cache_key]
+
+
+def list_pdf_files(input_dir):
+    pdf_files = []
+    for root, _, files in os.walk(input_dir):
+        for file in files:
+            if file.endswith(".pdf"):
+                pdf_files.append(os.path.join(root, file))
+    return sorted(pdf_files)
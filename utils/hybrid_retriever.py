@@ -0,0 +1,94 @@
+import os
+import re
+import math
+from llama_index.core.retrievers import BaseRetriever
+from llama_index.core.schema import NodeWithScore
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text):
+    # Identifiers such as policy numbers ("3073_3") are kept whole and also split into their parts,
+    # so both "3073_3" and "3073" match
+    tokens = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        tokens.append(token)
+        if "_" in token:
+            tokens.extend(part for part in token.split("_") if part)
+    return tokens
+
+
+def lexical_document(store, row):
+    # Policy numbers and titles appear only in file names ("Assessment_Policy_3073_3.pdf"), not in the extracted text,
+    # so each chunk is indexed together with its file's name
+    title = os.path.splitext(os.path.basename(store.file_path(row)))[0]
+    return f"{title}\n{store.text(row)}"
+
+
+# Okapi BM25 over an in-memory inverted index of term -> [(position, term frequency)], positions being the order of the
+# texts it was built from
+class BM25Index:
+    def __init__(self, texts, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings = {}
+        self.doc_lengths = []
+        for position, text in enumerate(texts):
+            term_counts = {}
+            tokens = tokenize(text)
+            for token in tokens:
+                term_counts[token] = term_counts.get(token, 0) + 1
+            for term, count in term_counts.items():
+                self.postings.setdefault(term, []).append((position, count))
+            self.doc_lengths.append(len(tokens))
+        self.avg_doc_length = (sum(self.doc_lengths) / len(self.doc_lengths)) if self.doc_lengths else 0.0
+        doc_count = len(self.doc_lengths)
+        self.idf = {term: math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+                    for term, postings in self.postings.items()}
+
+    def search(self, query, top_k):
+        # Returns [(position, score)], best first
+        scores = {}
+        for term in set(tokenize(query)):
+            for position, count in self.postings.get(term, ()):
+                length_norm = 1 - self.b + self.b * self.doc_lengths[position] / (self.avg_doc_length or 1.0)
+                term_score = self.idf[term] * count * (self.k1 + 1) / (count + self.k1 * length_norm)
+                scores[position] = scores.get(position, 0.0) + term_score
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+
+
+# Fuses dense and BM25 rankings over the embedded chunks of a CompactChunkStore with reciprocal rank fusion. Nodes are
+# only built for the chunks returned, and their scores stay cosine similarities so downstream relevance scoring sees
+# the same scale as with the plain vector retriever.
+class HybridRetriever(BaseRetriever):
+    def __init__(self, store, embed_model, similarity_top_k=2, candidate_top_k=10, lexical_weight=1.0, rrf_k=60):
+        super().__init__()
+        self.store = store
+        self.embed_model = embed_model
+        # Lexical index over the same chunks as the embedding matrix; its positions map to store rows
+        self.bm25_index = BM25Index(lexical_document(store, row) for row in store.embedded_rows)
+        self.similarity_top_k = similarity_top_k
+        self.candidate_top_k = candidate_top_k
+        self.lexical_weight = lexical_weight
+        self.rrf_k = rrf_k
+
+    def _retrieve(self, query_bundle):
+        if query_bundle.embedding is None:
+            query_bundle.embedding = self.embed_model.get_query_embedding(query_bundle.query_str)
+        vector_hits = self.store.search(query_bundle.embedding, self.candidate_top_k)
+        lexical_hits = [(int(self.store.embedded_rows[position]), score)
+                        for position, score in self.bm25_index.search(query_bundle.query_str, self.candidate_top_k)]
+
+        fused = {}
+        cosine_scores = dict(vector_hits)
+        for rank, (row, _) in enumerate(vector_hits):
+            fused[row] = fused.get(row, 0.0) + 1.0 / (self.rrf_k + rank + 1)
+        for rank, (row, _) in enumerate(lexical_hits):
+            fused[row] = fused.get(row, 0.0) + self.lexical_weight / (self.rrf_k + rank + 1)
+
+        top_rows = sorted(fused, key=fused.get, reverse=True)[:self.similarity_top_k]
+        # Lexical-only hits are scored against their row of the embedding matrix
+        return [NodeWithScore(node=self.store.node(row),
+                              score=cosine_scores[row] if row in cosine_scores
+                              else self.store.similarity(row, query_bundle.embedding))
+                for row in top_rows]
@@ -0,0 +1,65 @@
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+# Builds the index for the latest requested corpus version on a background thread, so script reruns and other sessions
+# wait on the one build instead of starting their own. A request for a new version replaces the old result.
+class IndexPreloader:
+    def __init__(self, build_fn):
+        self.build_fn = build_fn
+        self.condition = threading.Condition()
+        self.version = None
+        self.args = ()
+        self.result = None
+        self.error = None
+        self.done = False
+        self.building = None
+        self.thread = threading.Thread(target=self._run, name="index-preloader", daemon=True)
+        self.thread.start()
+
+    def request(self, version, *args):
+        with self.condition:
+            if version == self.version:
+                return
+            self.version, self.args = version, args
+            self.result, self.error, self.done = None, None, False
+            self.condition.notify_all()
+
+    def wait(self, version):
+        with self.condition:
+            self.condition.wait_for(lambda: self.version != version or self.done)
+            if self.version != version:
+                raise RuntimeError("Index build was superseded by a newer version of the documents")
+            if self.error is not None:
+                raise self.error
+            return self.result
+
+    def clear(self):
+        with self.condition:
+            self.version, self.args = None, ()
+            self.result, self.error, self.done = None, None, False
+            self.condition.notify_all()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.version is not None and not self.done
+                                        and self.building != self.version)
+                version, args = self.version, self.args
+                self.building = version
+
+            result, error = None, None
+            try:
+                result = self.build_fn(*args)
+            except Exception as e:
+                logger.error(f"Error building index: {e}")
+                error = e
+
+            with self.condition:
+                self.building = None
+                # A build that was cleared or superseded while running is dropped
+                if version == self.version:
+                    self.result, self.error, self.done = result, error, True
+                self.condition.notify_all()
@@ -0,0 +1,20 @@
+import os
+import hashlib
+from utils.chunk_store import remove_other_versions
+from utils.file_hash import file_sha256, list_pdf_files
+
+STORAGE_DIR = "./storage"
+
+
+def corpus_fingerprint(input_dir):
+    digest = hashlib.sha256()
+    for file_path in list_pdf_files(input_dir):
+        digest.update(os.path.relpath(file_path, input_dir).encode("utf-8"))
+        digest.update(file_sha256(file_path).encode("ascii"))
+    return digest.hexdigest()[:16]
+
+
+def remove_persisted_indexes(storage_dir=STORAGE_DIR):
+    # Indexes used to be persisted as llama_index JSON under storage/v<N>; the vectors now come from the embedding
+    # cache, so any such directory is left over from an earlier version
+    remove_other_versions(storage_dir, None)
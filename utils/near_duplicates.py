@@ -0,0 +1,126 @@
+import re
+import hashlib
+import logging
+import numpy as np
+
+WORD_PATTERN = re.compile(r"\w+")
+SHINGLE_SIZE = 3
+# 32 bands of 4 rows: pairs above roughly 0.45 Jaccard similarity become candidates, which are then confirmed
+# against the exact shingle sets, so the banding only has to be fast, not precise
+NUM_PERMUTATIONS = 128
+BANDS = 32
+MAX_HASH = np.uint64((1 << 32) - 1)
+
+logger = logging.getLogger(__name__)
+
+# Fixed seed so signatures are the same in every process and on every run
+_generator = np.random.default_rng(302)
+_PERMUTATION_A = _generator.integers(1, 1 << 63, size=NUM_PERMUTATIONS, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+_PERMUTATION_B = _generator.integers(0, 1 << 63, size=NUM_PERMUTATIONS, dtype=np.uint64)
+_BAND_MULTIPLIERS = _generator.integers(1, 1 << 63, size=NUM_PERMUTATIONS // BANDS, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+
+
+def shingles(text):
+    words = WORD_PATTERN.findall(text.lower())
+    if len(words) <= SHINGLE_SIZE:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+def shingle_hash(shingle):
+    # A well-mixed 32-bit hash; CRC32 is linear, so the shingles of one chunk would get correlated minima
+    return int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=4).digest(), "little")
+
+
+def minhash_signatures(shingle_sets, block_size=4096):
+    # One row per shingle set: its 32-bit shingle hashes under NUM_PERMUTATIONS multiply-shift hashes
+    # ((a*x + b) mod 2^64) >> 32 with random odd a, minimised per permutation. uint64 arithmetic wraps, which is the
+    # mod 2^64. Sets are processed in blocks so the (shingles x permutations) matrix stays small; empty sets get a
+    # row of MAX_HASH.
+    signatures = np.full((len(shingle_sets), NUM_PERMUTATIONS), MAX_HASH, dtype=np.uint64)
+    for block_start in range(0, len(shingle_sets), block_size):
+        block = [(position, shingle_set) for position, shingle_set in
+                 enumerate(shingle_sets[block_start:block_start + block_size], start=block_start) if shingle_set]
+        if not block:
+            continue
+        hashes = np.fromiter((shingle_hash(shingle) for _, shingle_set in block for shingle in shingle_set),
+                             dtype=np.uint64)
+        starts = np.cumsum([0] + [len(shingle_set) for _, shingle_set in block[:-1]])
+        permuted = (np.outer(hashes, _PERMUTATION_A) + _PERMUTATION_B) >> np.uint64(32)
+        signatures[[position for position, _ in block]] = np.minimum.reduceat(permuted, starts, axis=0)
+    return signatures
+
+
+def jaccard(a, b):
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+def near_duplicate_groups(texts, threshold=0.85):
+    # Returns lists of positions in `texts` whose shingle sets have at least `threshold` Jaccard similarity
+    # (transitively), each sorted and of length two or more
+    shingle_sets = [shingles(text) for text in texts]
+    signatures = minhash_signatures(shingle_sets)
+    rows = NUM_PERMUTATIONS // BANDS
+    candidates = np.array([position for position, shingle_set in enumerate(shingle_sets) if shingle_set], dtype=np.int64)
+    buckets = []
+    for band in range(BANDS):
+        # Chunks whose signatures agree on every row of a band share a bucket key; a rare key collision only adds a
+        # candidate pair, which the exact check below rejects
+        bucket_keys = signatures[candidates, band * rows:(band + 1) * rows] @ _BAND_MULTIPLIERS
+        order = np.argsort(bucket_keys, kind="stable")
+        sorted_keys = bucket_keys[order]
+        starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+        ends = np.r_[starts[1:], len(order)]
+        shared = ends - starts > 1
+        buckets.extend(candidates[order[start:end]].tolist() for start, end in zip(starts[shared], ends[shared]))
+
+    parent = list(range(len(texts)))
+
+    def find(position):
+        while parent[position] != position:
+            parent[position] = parent[parent[position]]
+            position = parent[position]
+        return position
+
+    checked = set()
+    for members in buckets:
+        for i, first in enumerate(members):
+            for second in members[i + 1:]:
+                if (first, second) in checked:
+                    continue
+                checked.add((first, second))
+                root_first, root_second = find(first), find(second)
+                if root_first != root_second and jaccard(shingle_sets[first], shingle_sets[second]) >= threshold:
+                    parent[max(root_first, root_second)] = min(root_first, root_second)
+
+    groups = {}
+    for position in range(len(texts)):
+        groups.setdefault(find(position), []).append(position)
+    return [members for members in groups.values() if len(members) > 1]
+
+
+def collapse_near_duplicates(docs, threshold=0.85):
+    # Keeps the first chunk of each near-duplicate group (docs are in file order) as the one to embed and records the
+    # other files it appears in under `duplicate_files` on it; returns the documents to index
+    groups = near_duplicate_groups([doc.text for doc in docs], threshold)
+    dropped = set()
+    for members in groups:
+        representative = docs[members[0]]
+        file_path = representative.metadata.get("file_path")
+        duplicate_files = []
+        for position in members[1:]:
+            dropped.add(position)
+            other_file = docs[position].metadata.get("file_path")
+            if other_file != file_path and other_file not in duplicate_files:
+                duplicate_files.append(other_file)
+        if duplicate_files:
+            representative.metadata["duplicate_files"] = duplicate_files
+            # New lists, as documents may share their exclusion lists
+            representative.excluded_embed_metadata_keys = [
+                *(key for key in representative.excluded_embed_metadata_keys if key != "duplicate_files"),
+                "duplicate_files"]
+            representative.excluded_llm_metadata_keys = [
+                *(key for key in representative.excluded_llm_metadata_keys if key != "duplicate_files"),
+                "duplicate_files"]
+    logger.info(f"Near-duplicate chunks: {len(dropped)} of {len(docs)} collapsed into {len(groups)} representatives")
+    return [doc for position, doc in enumerate(docs) if position not in dropped]
@@ -0,0 +1,60 @@
+import threading
+import httpx
+from openai import OpenAI, AsyncOpenAI
+from utils.config import get_setting
+
+# One HTTP connection pool (and one async pool) per process, shared by the RAG page, the categorizer, the LLM and the
+# embedding model, so requests reuse warm TLS connections instead of each client opening its own
+_lock = threading.RLock()
+_clients = {}
+
+
+def _timeout():
+    return httpx.Timeout(get_setting("openai_read_timeout", 60.0), connect=get_setting("openai_connect_timeout", 5.0))
+
+
+def _limits():
+    return httpx.Limits(max_connections=get_setting("openai_max_connections", 20),
+                        max_keepalive_connections=get_setting("openai_max_keepalive_connections", 10),
+                        keepalive_expiry=60.0)
+
+
+def _get_or_create(name, factory):
+    with _lock:
+        if name not in _clients:
+            _clients[name] = factory()
+        return _clients[name]
+
+
+def get_http_client():
+    return _get_or_create("http", lambda: httpx.Client(timeout=_timeout(), limits=_limits()))
+
+
+def get_async_http_client():
+    # Must be used from a single event loop, like any httpx.AsyncClient
+    return _get_or_create("async_http", lambda: httpx.AsyncClient(timeout=_timeout(), limits=_limits()))
+
+
+def get_client():
+    return _get_or_create("openai", lambda: OpenAI(api_key=get_setting("openai_key"), http_client=get_http_client(),
+                                                   max_retries=get_setting("openai_max_retries", 2)))
+
+
+def get_async_client():
+    return _get_or_create("async_openai", lambda: AsyncOpenAI(api_key=get_setting("openai_key"),
+                                                              http_client=get_async_http_client(),
+                                                              max_retries=get_setting("openai_max_retries", 2)))
+
+
+def get_llm(**kwargs):
+    from llama_index.llms.openai import OpenAI as LlamaOpenAI
+    return LlamaOpenAI(api_key=get_setting("openai_key"), timeout=get_setting("openai_read_timeout", 60.0),
+                       max_retries=get_setting("openai_max_retries", 2), openai_client=get_client(),
+                       async_openai_client=get_async_client(), **kwargs)
+
+
+def get_embedding_model(**kwargs):
+    from llama_index.embeddings.openai import OpenAIEmbedding
+    return OpenAIEmbedding(api_key=get_setting("openai_key"), timeout=get_setting("openai_read_timeout", 60.0),
+                           max_retries=get_setting("openai_max_retries", 2), http_client=get_http_client(),
+                           async_http_client=get_async_http_client(), **kwargs)
@@ -0,0 +1,58 @@
+import os
+import logging
+import fitz  # PyMuPDF
+from utils.chunk_store import atomic_write
+from utils.file_hash import file_sha256
+from utils.source_files import read_source
+
+# Next to the text cache, so cited pages are cut out of each version of a PDF once and then served from disk
+PAGE_PREVIEW_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "processed_chunks", "pages")
+
+logger = logging.getLogger(__name__)
+
+
+def page_range_pdf(file_path, page_start, page_end, cache_dir=PAGE_PREVIEW_DIR):
+    # A small PDF holding only pages page_start..page_end (1-based, inclusive) of the source
+    cache_path = os.path.join(cache_dir, f"{file_sha256(file_path)}_{page_start}_{page_end}.pdf")
+    if not os.path.exists(cache_path):
+        source = fitz.open(file_path)
+        excerpt = fitz.open()
+        try:
+            excerpt.insert_pdf(source, from_page=page_start - 1, to_page=page_end - 1)
+            atomic_write(cache_path, excerpt.tobytes(garbage=3, deflate=True))
+        finally:
+            excerpt.close()
+            source.close()
+        logger.info(f"Extracted pages {page_start}-{page_end} of {file_path}")
+    return cache_path
+
+
+def page_png(file_path, page, zoom=1.5, cache_dir=PAGE_PREVIEW_DIR):
+    cache_path = os.path.join(cache_dir, f"{file_sha256(file_path)}_{page}_{round(zoom * 100)}.png")
+    if not os.path.exists(cache_path):
+        doc = fitz.open(file_path)
+        try:
+            pixmap = doc.load_page(page - 1).get_pixmap(matrix=fitz.Matrix(zoom, zoom))
+            atomic_write(cache_path, pixmap.tobytes("png"))
+        finally:
+            doc.close()
+        logger.info(f"Rendered page {page} of {file_path}")
+    return cache_path
+
+
+def prune_page_previews(file_paths, cache_dir=PAGE_PREVIEW_DIR):
+    # Deletes excerpts and page images of PDFs that were changed or removed; entries are named "<sha256>_..."
+    live_hashes = {file_sha256(file_path) for file_path in file_paths}
+    for entry in os.listdir(cache_dir) if os.path.isdir(cache_dir) else []:
+        if entry.endswith((".pdf", ".png")) and entry.split("_", 1)[0] not in live_hashes:
+            os.remove(os.path.join(cache_dir, entry))
+            logger.info(f"Removed stale page preview {entry}")
+
+
+def lazy_page_range(file_path, page_start, page_end):
+    # For st.download_button: the pages are only cut out when the button is clicked
+    return lambda: read_source(page_range_pdf(file_path, page_start, page_end))
+
+
+def page_label(page_start, page_end):
+    return f"p. {page_start}" if page_start == page_end else f"pp. {page_start}-{page_end}"
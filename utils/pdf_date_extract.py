@@ -1,9 +1,13 @@
-import fitz  # PyMuPDF
 import os
 import re
+import sys
 import sqlite3
 from datetime import datetime
 
+# Allow running this file directly as well as importing it from the dashboard
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.text_cache import get_text
+
 def extract_governance_info(text):
     # Regular expressions to extract the required fields
     approval_authority = re.search(r'Approval Authority\s+(.*)', text)
@@ -29,11 +33,7 @@ def extract_governance_info(text):
 
 def process_pdf(file_path):
     try:
-        doc = fitz.open(file_path)
-        text = ""
-        for page_num in range(doc.page_count):
-            page = doc.load_page(page_num)
-            text += page.get_text()
+        text = get_text(file_path)
         governance_info = extract_governance_info(text)
         return governance_info
     except Exception as e:
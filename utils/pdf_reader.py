@@ -1,84 +1,198 @@
 import os
-import pickle
+import bisect
 import logging
-import fitz  # PyMuPDF
-from llama_index.core import Document
-import nltk
-from nltk.tokenize import word_tokenize
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+# Worker processes import this module, so anything they do not need (llama_index, Streamlit through utils.config,
+# the page preview cache) is imported where it is used
+from utils.boilerplate import boilerplate_by_file, boilerplate_fingerprint, line_stats, strip_boilerplate
+from utils.chunk_store import ChunkStore
+from utils.file_hash import file_sha256, list_pdf_files
+from utils.text_cache import is_text_cached, iter_page_texts, prune_text_cache
+from utils.tokenizer import iter_token_spans
+
+# Position of a chunk in its PDF: 1-based page numbers, char_start as an offset into the extracted text of page_start
+# and char_end as an (exclusive) offset into the extracted text of page_end, i.e. into the pages the text cache holds.
+# text_start is the chunk's offset in the document text after boilerplate removal, which overlapping chunks are
+# merged by. Kept out of the embedded and LLM-visible text so adding them changes neither embeddings nor prompts.
+CHUNK_POSITION_KEYS = ["page_start", "page_end", "char_start", "char_end", "text_start"]
+
+
+def page_number(offsets, char_offset):
+    return max(bisect.bisect_right(offsets, char_offset), 1)
+
+
+def page_offset(runs, stripped_offset):
+    # Maps an offset in a page's stripped text to the extracted page text, using strip_boilerplate's kept runs
+    starts = [start for start, _ in runs]
+    stripped_start, page_start = runs[max(bisect.bisect_right(starts, stripped_offset) - 1, 0)]
+    return page_start + stripped_offset - stripped_start
+
 
 class PDFReader:
-    def __init__(self, input_dir, chunk_size=100, overlap_size=20, save_dir="./processed_chunks"):
+    def __init__(self, input_dir, chunk_size=100, overlap_size=20, save_dir="./processed_chunks", workers=None):
         self.input_dir = input_dir
         self.chunk_size = chunk_size
         self.overlap_size = overlap_size
         self.save_dir = save_dir
-        nltk.download('punkt', quiet=True)  # Download the punkt tokenizer for sentence splitting
+        from utils.config import get_setting
+        # Number of processes used to parse PDFs that are not in the text cache yet (1 = in-process)
+        self.workers = workers if workers is not None else get_setting("ingest_workers", os.cpu_count() or 1)
         logging.basicConfig(level=logging.INFO)
         self.logger = logging.getLogger(__name__)
 
     def load_data(self):
+        from llama_index.core import Document
+        from utils.page_preview import prune_page_previews
+
         docs = []
-        processed_chunks = self.load_processed_chunks()
-        for root, _, files in os.walk(self.input_dir):
-            for file in files:
-                if file.endswith(".pdf"):
-                    file_path = os.path.join(root, file)
-                    try:
-                        current_mod_time = os.path.getmtime(file_path)
-                        cache_key = f"{file_path}_{self.chunk_size}_{self.overlap_size}"
-                        if cache_key not in processed_chunks or processed_chunks[cache_key]["mod_time"] < current_mod_time:
-                            pdf_content = self.extract_text_from_pdf(file_path)
-                            self.logger.info(f"Extracted text from {file_path}")
-                            chunks = self.chunk_text(pdf_content)
-                            processed_chunks[cache_key] = {
-                                "chunks": chunks,
-                                "mod_time": current_mod_time
-                            }
-                            self.save_processed_chunks(processed_chunks)
-                            self.logger.info(f"Created {len(chunks)} chunks for {file_path}")
-                        else:
-                            chunks = processed_chunks[cache_key]["chunks"]
-                            self.logger.info(f"Loaded {len(chunks)} processed chunks for {file_path}")
-                        for i, chunk in enumerate(chunks):
-                            doc = Document(text=chunk, extra_info={"file_path": file_path, "chunk_id": i})
-                            docs.append(doc)
-                    except Exception as e:
-                        self.logger.error(f"Error processing {file_path}: {e}")
+        chunk_store = ChunkStore(self.save_dir, self.chunk_size, self.overlap_size)
+        file_paths = list_pdf_files(self.input_dir)
+
+        # Repeated headers, footers and disclaimers are stripped before chunking. What is stripped from a file depends
+        # on the rest of the corpus, so it is part of the key the file's chunks are stored under.
+        # Parsing PDFs is the only step worth worker processes: files whose page texts are cached are read back
+        # in-process, and the pool parses the others (filling the text cache) while gathering their line stats
+        cached, uncached = [], []
+        for file_path in file_paths:
+            (cached if is_text_cached(file_path) else uncached).append(file_path)
+        stats_by_file = dict(self.map_files(self.file_line_stats, cached, workers=1))
+        stats_by_file.update(self.map_files(self.file_line_stats, uncached))
+        boilerplate = boilerplate_by_file(stats_by_file)
+
+        chunks_by_file = {}
+        pending = {}
+        for file_path in file_paths:
+            if file_path not in boilerplate:
+                continue
+            try:
+                chunk_key = f"{file_sha256(file_path)}-{boilerplate_fingerprint(boilerplate[file_path])}"
+                chunks = chunk_store.get(file_path, chunk_key)
+                if chunks is None:
+                    pending[file_path] = chunk_key
+                else:
+                    chunks_by_file[file_path] = chunks
+                    self.logger.info(f"Loaded {len(chunks)} processed chunks for {file_path}")
+            except Exception as e:
+                self.logger.error(f"Error processing {file_path}: {e}")
+
+        # Every file's text is cached by now, so chunking runs in-process
+        for file_path, chunks in self.process_files(list(pending), boilerplate):
+            chunk_store.put(file_path, pending[file_path], chunks)
+            chunks_by_file[file_path] = chunks
+            self.logger.info(f"Created {len(chunks)} chunks for {file_path}")
+
+        # Build documents in sorted file order so ids and ordering never depend on which worker finished first
+        for file_path in file_paths:
+            for i, chunk in enumerate(chunks_by_file.get(file_path, [])):
+                position = {key: chunk[key] for key in CHUNK_POSITION_KEYS}
+                doc = Document(text=chunk["text"], extra_info={"file_path": file_path, "chunk_id": i, **position},
+                               excluded_embed_metadata_keys=CHUNK_POSITION_KEYS,
+                               excluded_llm_metadata_keys=CHUNK_POSITION_KEYS,
+                               id_=f"{file_path}#{i}")
+                docs.append(doc)
+        chunk_store.prune(set(file_paths))
+        chunk_store.save_manifest()
+        prune_text_cache(file_paths)
+        prune_page_previews(file_paths)
         return docs
 
-    def extract_text_from_pdf(self, file_path):
-        doc = fitz.open(file_path)
-        text = ""
-        for page_num in range(len(doc)):
-            page = doc.load_page(page_num)
-            text += page.get_text()
-        doc.close()
-        self.logger.info("Extracted text from PDF")
-        return text
-
-    def chunk_text(self, text):
-        words = word_tokenize(text)
-        chunks = []
-        start = 0
-        while start < len(words):
-            end = min(start + self.chunk_size, len(words))
-            chunk = ' '.join(words[start:end])
-            chunks.append(chunk)
-            start += self.chunk_size - self.overlap_size
-        self.logger.info(f"Chunked text into {len(chunks)} chunks")
+    def process_file(self, file_path, boilerplate=frozenset()):
+        # Pages stream from the text cache through boilerplate removal into the chunker, so only the current page and
+        # the unfinished chunk window are held in memory besides the chunks themselves
+        chunks = list(self.iter_chunks(strip_boilerplate(self.extract_pages_from_pdf(file_path), boilerplate)))
+        self.logger.info(f"Extracted and chunked text from {file_path} into {len(chunks)} chunks")
         return chunks
 
-    def save_processed_chunks(self, processed_chunks):
-        os.makedirs(self.save_dir, exist_ok=True)
-        with open(os.path.join(self.save_dir, "processed_chunks.pkl"), "wb") as f:
-            pickle.dump(processed_chunks, f)
-        self.logger.info("Saved processed chunks to file")
-
-    def load_processed_chunks(self):
-        try:
-            with open(os.path.join(self.save_dir, "processed_chunks.pkl"), "rb") as f:
-                processed_chunks = pickle.load(f)
-            self.logger.info("Loaded processed chunks from file")
-            return processed_chunks
-        except FileNotFoundError:
-            return {}
\ No newline at end of file
+    def file_line_stats(self, file_path):
+        return line_stats(self.extract_pages_from_pdf(file_path))
+
+    def process_files(self, file_paths, boilerplate=None):
+        # Yields (file_path, chunks) for every file that was processed successfully
+        yield from self.map_files(self.process_file, file_paths, boilerplate, workers=1)
+
+    def map_files(self, fn, file_paths, per_file_args=None, workers=None):
+        # Yields (file_path, fn(file_path[, per_file_args[file_path]])) for every file fn succeeds on, using worker
+        # processes when configured (workers overrides self.workers); a failing file is logged and skipped
+        per_file_args = per_file_args or {}
+        jobs = [(file_path, (file_path, per_file_args[file_path]) if file_path in per_file_args else (file_path,))
+                for file_path in file_paths]
+        workers = min(self.workers if workers is None else workers, len(jobs))
+        if workers <= 1:
+            for file_path, args in jobs:
+                try:
+                    yield file_path, fn(*args)
+                except Exception as e:
+                    self.logger.error(f"Error processing {file_path}: {e}")
+            return
+
+        self.logger.info(f"Processing {len(jobs)} PDFs with {workers} worker processes")
+        # Spawned, not forked: this runs on a background thread of the Streamlit server, and a forked child could
+        # inherit a lock (e.g. a logging handler's) held by another thread and block forever
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+            futures = [(file_path, executor.submit(fn, *args)) for file_path, args in jobs]
+            for file_path, future in futures:
+                try:
+                    yield file_path, future.result()
+                except Exception as e:
+                    self.logger.error(f"Error processing {file_path}: {e}")
+
+    def extract_pages_from_pdf(self, file_path):
+        # Lazily served from the shared per-page text cache, which the governance extractor reads as well
+        return iter_page_texts(file_path)
+
+    def iter_chunks(self, pages):
+        # Takes (stripped page text, kept runs) pairs from strip_boilerplate and yields chunks of chunk_size tokens,
+        # consecutive chunks sharing overlap_size tokens, as soon as each window is complete. Chunk text is sliced from
+        # the stripped pages, so it keeps the original spacing and line breaks. Only text from the start of the current
+        # window onwards, and the kept runs of the pages it covers, are buffered.
+        step = self.chunk_size - self.overlap_size
+        page_starts = []
+        page_runs = {}  # 1-based page number -> kept runs, for the pages still in the buffer
+        buffer = ""
+        buffer_offset = 0  # document offset of buffer[0]
+        scanned = 0  # document offset up to which the buffer has been tokenized
+        spans = []  # document offsets of the tokens from the start of the current window
+
+        def make_chunk(count):
+            text_start, text_end = spans[0][0], spans[count - 1][1]
+            page_start = page_number(page_starts, text_start)
+            page_end = page_number(page_starts, text_end - 1)
+            return {
+                "text": buffer[text_start - buffer_offset:text_end - buffer_offset],
+                "page_start": page_start,
+                "page_end": page_end,
+                "char_start": page_offset(page_runs[page_start], text_start - page_starts[page_start - 1]),
+                # The last character is mapped, not the end, which may fall on a stripped line
+                "char_end": page_offset(page_runs[page_end], text_end - 1 - page_starts[page_end - 1]) + 1,
+                "text_start": text_start
+            }
+
+        for page_text, runs in pages:
+            page_starts.append(buffer_offset + len(buffer))
+            page_runs[len(page_starts)] = runs
+            buffer += page_text
+            # A word running up to the end of the page may continue on the next one, so tokenizing stops at the last
+            # whitespace and the trailing word is picked up with the next page
+            cut = len(buffer)
+            while cut > scanned - buffer_offset and not buffer[cut - 1].isspace():
+                cut -= 1
+            spans.extend((start + buffer_offset, end + buffer_offset)
+                         for start, end in iter_token_spans(buffer, scanned - buffer_offset, cut))
+            scanned = max(scanned, buffer_offset + cut)
+
+            while len(spans) >= self.chunk_size:
+                yield make_chunk(self.chunk_size)
+                del spans[:step]
+            # Drop text no later chunk can reach
+            keep_from = spans[0][0] if spans else scanned
+            buffer = buffer[keep_from - buffer_offset:]
+            buffer_offset = keep_from
+            for page in [page for page in page_runs if page < page_number(page_starts, keep_from)]:
+                del page_runs[page]
+
+        spans.extend((start + buffer_offset, end + buffer_offset)
+                     for start, end in iter_token_spans(buffer, scanned - buffer_offset))
+        while spans:
+            yield make_chunk(min(self.chunk_size, len(spans)))
+            del spans[:step]
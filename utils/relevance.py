@@ -0,0 +1,62 @@
+import re
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+
+def fit_corpus_vectorizer(texts):
+    # Fitted once per corpus version on the chunk texts, so IDF weights reflect the whole document library; None for
+    # an empty library, which has no vocabulary to fit
+    if not texts:
+        return None
+    return TfidfVectorizer(sublinear_tf=True, stop_words="english").fit(texts)
+
+
+def tfidf_similarities(vectorizer, query, response, source_texts):
+    # Rows come out L2-normalised, so one sparse product gives every cosine similarity against query and response
+    vectors = vectorizer.transform([query, response, *source_texts])
+    similarities = (vectors @ vectors[:2].T).toarray()
+    query_response = float(similarities[1, 0])
+    query_sources = similarities[2:, 0]
+    response_sources = similarities[2:, 1]
+    return query_response, query_sources, response_sources
+
+
+SENTENCE_PATTERN = re.compile(r"(?<=[.!?;:])\s+|\n+")
+# Refusals only: the answer has to open with one (optionally after "Based on the provided context, "), so factual
+# answers stating what a policy does not allow ("The University does not provide parking permits to ...") still score
+REFUSAL_PATTERN = re.compile(
+    r"(based on the (provided |given )?(context|information|documents?)[^,.]*, )?"
+    r"(empty response$|i'?m sorry|sorry|i apologi[sz]e|unfortunately, i|i (am|'m) (unable|not able)|i (don't|do not) know"
+    r"|i (cannot|can't) (answer|determine|find)|unable to provide an answer"
+    r"|((the )?(provided |given )?(context|documents?|sources?)|the (provided|given) information)( provided| given)? "
+    r"(does|do) not "
+    r"(contain|provide|mention|include|specify|say)"
+    r"|there is no (relevant |specific )?information|no (relevant |specific )?information (is|was) (available|provided|found))")
+
+
+def grounded_relevance_score(vectorizer, query, response, source_texts, retrieval_scores, grounding_threshold=0.3):
+    # Millisecond-scale replacement for the LLM review: 0-100 built from how much of the answer is supported by the
+    # sources (sentence level), how many query terms the sources contain, the retrieval scores and query-answer overlap
+    if not response.strip() or REFUSAL_PATTERN.match(response.strip().lower()) or not source_texts:
+        return 0.0
+
+    analyzer = vectorizer.build_analyzer()
+    sentences = [sentence for sentence in SENTENCE_PATTERN.split(response) if len(analyzer(sentence)) >= 3]
+    if not sentences:
+        sentences = [response]
+
+    vectors = vectorizer.transform([query, *sentences, *source_texts])
+    sentence_vectors = vectors[1:1 + len(sentences)]
+    source_vectors = vectors[1 + len(sentences):]
+    best_support = (sentence_vectors @ source_vectors.T).toarray().max(axis=1)
+    grounding = float(np.minimum(best_support / grounding_threshold, 1.0).mean())
+
+    query_terms = set(analyzer(query))
+    source_terms = set(term for text in source_texts for term in analyzer(text))
+    lexical_overlap = len(query_terms & source_terms) / len(query_terms) if query_terms else 0.0
+
+    retrieval = float(np.clip(np.mean(retrieval_scores), 0.0, 1.0)) if len(retrieval_scores) else 0.0
+
+    query_response, _, _ = tfidf_similarities(vectorizer, query, response, [])
+    score = 0.45 * grounding + 0.25 * lexical_overlap + 0.15 * retrieval + 0.15 * min(query_response * 2, 1.0)
+    return round(100 * score, 2)
@@ -0,0 +1,40 @@
+import os
+import shutil
+import zipfile
+import tempfile
+
+PDF_DIR = "pdfs"
+
+# Archives larger than this spill from memory to a temporary file while they are built
+ZIP_SPOOL_BYTES = 8 * 1024 * 1024
+
+
+def source_path(source, pdf_dir=PDF_DIR):
+    return os.path.join(pdf_dir, source)
+
+
+def read_source(path):
+    # Streamlit reads any file object it is given into bytes as well, so one read is the least copying possible
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def lazy_source(path):
+    # st.download_button calls this only when the button is clicked, not on every rerun
+    return lambda: read_source(path)
+
+
+def zip_sources(paths):
+    # PDFs are already compressed, so entries are stored as-is and each file is copied across in blocks
+    with tempfile.SpooledTemporaryFile(max_size=ZIP_SPOOL_BYTES) as archive:
+        with zipfile.ZipFile(archive, "w", compression=zipfile.ZIP_STORED) as zf:
+            for path in paths:
+                with open(path, "rb") as src, zf.open(os.path.basename(path), "w", force_zip64=True) as dst:
+                    shutil.copyfileobj(src, dst, 1024 * 1024)
+        archive.seek(0)
+        # Streamlit only serves bytes or in-memory buffers, so the finished archive is read back once, on click
+        return archive.read()
+
+
+def lazy_zip(paths):
+    return lambda: zip_sources(paths)
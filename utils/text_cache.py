@@ -0,0 +1,80 @@
+import os
+import json
+import logging
+import tempfile
+import fitz  # PyMuPDF
+from utils.file_hash import file_sha256
+
+# Absolute so the RAG reader and the governance extractor share one cache whatever their working directory
+TEXT_CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "processed_chunks", "text")
+
+logger = logging.getLogger(__name__)
+
+
+def iter_extracted_page_texts(file_path):
+    doc = fitz.open(file_path)
+    try:
+        for page_num in range(doc.page_count):
+            yield doc.load_page(page_num).get_text()
+    finally:
+        doc.close()
+
+
+def text_cache_path(file_path, cache_dir=TEXT_CACHE_DIR):
+    return os.path.join(cache_dir, f"{file_sha256(file_path)}.jsonl")
+
+
+def is_text_cached(file_path, cache_dir=TEXT_CACHE_DIR):
+    return os.path.exists(text_cache_path(file_path, cache_dir))
+
+
+def iter_page_texts(file_path, cache_dir=TEXT_CACHE_DIR):
+    # Yields page texts one at a time from a JSON-lines cache keyed by content hash, so each version of a PDF is parsed
+    # once no matter how many consumers read it and no consumer has to hold the whole document
+    cache_path = text_cache_path(file_path, cache_dir)
+    try:
+        f = open(cache_path, "r", encoding="utf-8")
+    except FileNotFoundError:
+        yield from _extract_and_cache(file_path, cache_path)
+        return
+    with f:
+        for line in f:
+            yield json.loads(line)
+
+
+def _extract_and_cache(file_path, cache_path):
+    # Pages are passed on as they are parsed and appended to a temp file that replaces the cache entry once the last
+    # page is written; a consumer that stops early leaves no partial entry behind
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(cache_path), suffix=".tmp")
+    try:
+        page_count = 0
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            for page_text in iter_extracted_page_texts(file_path):
+                f.write(json.dumps(page_text, ensure_ascii=False) + "\n")
+                page_count += 1
+                yield page_text
+        os.replace(tmp_path, cache_path)
+        logger.info(f"Cached text of {page_count} pages for {file_path}")
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def cache_page_texts(file_path, cache_dir=TEXT_CACHE_DIR):
+    # Parses a PDF into the cache, if it is not there yet, without keeping its text
+    for _ in iter_page_texts(file_path, cache_dir):
+        pass
+
+
+def get_text(file_path, cache_dir=TEXT_CACHE_DIR):
+    return "".join(iter_page_texts(file_path, cache_dir))
+
+
+def prune_text_cache(file_paths, cache_dir=TEXT_CACHE_DIR):
+    # Deletes the entries of PDFs that were changed or removed, and any left in the old whole-document .json format
+    live_entries = {f"{file_sha256(file_path)}.jsonl" for file_path in file_paths}
+    for entry in os.listdir(cache_dir) if os.path.isdir(cache_dir) else []:
+        if entry.endswith((".jsonl", ".json")) and entry not in live_entries:
+            os.remove(os.path.join(cache_dir, entry))
+            logger.info(f"Removed stale text cache entry {entry}")
@@ -0,0 +1,11 @@
+import re
+
+# Words (keeping internal hyphens, apostrophes and dots, as in "part-time", "candidate's" and "9.1") and single
+# punctuation marks, roughly the units NLTK's word_tokenize counts, found in one pass of a compiled regex
+TOKEN_PATTERN = re.compile(r"\w+(?:[-'’.]\w+)*|[^\w\s]")
+
+
+def iter_token_spans(text, pos=0, endpos=None):
+    # Yields (start, end) character offsets, so callers slice tokens or whole chunks straight from `text`
+    for match in TOKEN_PATTERN.finditer(text, pos, len(text) if endpos is None else endpos):
+        yield match.span()